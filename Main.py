@@ -14,7 +14,7 @@ import os
 # Add utils to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
 
-from utils.database import get_bigquery_client
+from utils.database import get_bigquery_client, queries_to_polars
 
 # Page configuration
 st.set_page_config(
@@ -29,97 +29,101 @@ def get_dashboard_overview():
     """Get dashboard overview using analytics tables"""
     client = get_bigquery_client()
     if not client:
-        return None
-    
-    try:
-        # Customer Overview - Aggregate metrics for dashboard
-        customer_query = """
-        SELECT 
-            CAST(COUNT(DISTINCT customer_id) AS INT64) as total_customers,
-            CAST(COUNT(DISTINCT customer_state) AS INT64) as total_states,
-            ROUND(SUM(total_spent), 2) as total_revenue,
-            ROUND(AVG(avg_order_value), 2) as avg_order_value,
-            ROUND(AVG(avg_review_score), 2) as avg_rating
-        FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-        WHERE total_orders > 0
-        """
-        
-        customer_result = client.query(customer_query).result()
-        customer_data = customer_result.to_dataframe().iloc[0].to_dict()
-        
-        # Total Orders from revenue analytics (actual distinct orders)
-        orders_query = """
-        SELECT 
-            CAST(COUNT(DISTINCT order_id) AS INT64) as total_orders
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
-        """
-        
-        orders_result = client.query(orders_query).result()
-        orders_data = orders_result.to_dataframe().iloc[0].to_dict()
-        customer_data.update(orders_data)
-        
-        # Geographic Overview
-        geo_query = """
-        SELECT 
-            CAST(COUNT(DISTINCT state_code) AS INT64) as states_count,
-            CAST(SUM(total_cities) AS INT64) as cities_count,
-            ROUND(AVG(market_opportunity_index), 2) as avg_market_opportunity
-        FROM `project-olist-470307.dbt_olist_analytics.geographic_analytics_obt`
-        """
-        
-        geo_result = client.query(geo_query).result()
-        geo_data = geo_result.to_dataframe().iloc[0].to_dict()
-        
-        # Recent Revenue Trends
-        revenue_query = """
-        SELECT 
-            order_year,
-            order_month,
-            COUNT(DISTINCT order_id) as monthly_orders,
-            ROUND(SUM(item_price), 2) as monthly_revenue
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
-        GROUP BY order_year, order_month
-        ORDER BY order_year DESC, order_month DESC
-        LIMIT 12
-        """
-        
-        revenue_result = client.query(revenue_query).result()
-        revenue_trends = pl.from_pandas(revenue_result.to_dataframe())
-        
-        return {
-            'customer_metrics': customer_data,
-            'geographic_metrics': geo_data,
-            'revenue_trends': revenue_trends
-        }
-        
-    except Exception as e:
-        st.error(f"Error loading dashboard data: {str(e)}")
-        return None
+        raise RuntimeError("Could not connect to BigQuery")
+    
+    # Customer Overview - Aggregate metrics for dashboard
+    customer_query = """
+    SELECT 
+        CAST(COUNT(DISTINCT customer_id) AS INT64) as total_customers,
+        CAST(COUNT(DISTINCT customer_state) AS INT64) as total_states,
+        ROUND(SUM(total_spent), 2) as total_revenue,
+        ROUND(AVG(avg_order_value), 2) as avg_order_value,
+        ROUND(AVG(avg_review_score), 2) as avg_rating
+    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
+    WHERE total_orders > 0
+    """
+    
+    # Total Orders from revenue analytics (actual distinct orders)
+    orders_query = """
+    SELECT 
+        CAST(COUNT(DISTINCT order_id) AS INT64) as total_orders
+    FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
+    WHERE order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
+    """
+    
+    # Geographic Overview
+    geo_query = """
+    SELECT 
+        CAST(COUNT(DISTINCT state_code) AS INT64) as states_count,
+        CAST(SUM(total_cities) AS INT64) as cities_count,
+        ROUND(AVG(market_opportunity_index), 2) as avg_market_opportunity
+    FROM `project-olist-470307.dbt_olist_analytics.geographic_analytics_obt`
+    """
+    
+    # Recent Revenue Trends
+    revenue_query = """
+    SELECT 
+        order_year,
+        order_month,
+        COUNT(DISTINCT order_id) as monthly_orders,
+        ROUND(SUM(item_price), 2) as monthly_revenue
+    FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
+    WHERE order_date >= DATE_SUB(CURRENT_DATE(), INTERVAL 12 MONTH)
+    GROUP BY order_year, order_month
+    ORDER BY order_year DESC, order_month DESC
+    LIMIT 12
+    """
+    
+    # Independent queries are submitted together and run concurrently
+    results = queries_to_polars(client, {
+        'customer': customer_query,
+        'orders': orders_query,
+        'geo': geo_query,
+        'revenue': revenue_query
+    })
+    
+    customer_data = results['customer'].row(0, named=True)
+    customer_data.update(results['orders'].row(0, named=True))
+    
+    # Chronological order and the month axis label are derived once here, not on every rerun
+    revenue_trends = results['revenue'].sort(['order_year', 'order_month']).with_columns(
+        pl.format(
+            "{}-{}",
+            pl.col('order_year'),
+            pl.col('order_month').cast(pl.Utf8).str.zfill(2)
+        ).alias('month_label')
+    )
+    
+    return {
+        'customer_metrics': customer_data,
+        'geographic_metrics': results['geo'].row(0, named=True),
+        'revenue_trends': revenue_trends
+    }
+
+METRIC_CARD_COLORS = {
+    "primary": {
+        "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
+    },
+    "success": {
+        "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
+        "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
+    },
+    "warning": {
+        "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
+    },
+    "info": {
+        "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
+        "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
+    }
+}
 
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_metric_card(title, value, icon, color="primary", subtitle=""):
     """Create a metric card with enhanced styling"""
-    color_schemes = {
-        "primary": {
-            "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-            "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
-        },
-        "success": {
-            "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
-            "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
-        },
-        "warning": {
-            "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
-            "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
-        },
-        "info": {
-            "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
-            "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
-        }
-    }
-    
-    selected_color = color_schemes.get(color, color_schemes["primary"])
+    # Memoized per card arguments so reruns reuse the rendered HTML
+    selected_color = METRIC_CARD_COLORS.get(color, METRIC_CARD_COLORS["primary"])
     
     return f"""
     <div style="
@@ -157,11 +161,12 @@ def main():
     
     # Load data
     with st.spinner("Loading dashboard overview..."):
-        data = get_dashboard_overview()
-    
-    if not data:
-        st.error("Unable to load dashboard data. Please check your connection.")
-        return
+        # Load failures raise instead of being cached, so the next rerun retries the queries
+        try:
+            data = get_dashboard_overview()
+        except Exception as e:
+            st.error(f"Error loading dashboard data: {str(e)}")
+            return
     
     # Main Metrics
     st.header("📈 Business Performance Overview")
@@ -255,16 +260,11 @@ def main():
     
     revenue_trends = data['revenue_trends']
     if not revenue_trends.is_empty():
-        # Convert to pandas for plotting
-        trends_pd = revenue_trends.to_pandas()
-        trends_pd['month_label'] = trends_pd['order_year'].astype(str) + '-' + trends_pd['order_month'].astype(str).str.zfill(2)
-        trends_pd = trends_pd.sort_values(['order_year', 'order_month'])
-        
         col1, col2 = st.columns(2)
         
         with col1:
             fig_orders = px.line(
-                trends_pd,
+                revenue_trends,
                 x='month_label',
                 y='monthly_orders',
                 title='Monthly Order Volume',
@@ -280,7 +280,7 @@ def main():
         
         with col2:
             fig_revenue = px.line(
-                trends_pd,
+                revenue_trends,
                 x='month_label',
                 y='monthly_revenue',
                 title='Monthly Revenue Performance',
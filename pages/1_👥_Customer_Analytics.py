@@ -14,110 +14,166 @@ import os
 # Add utils to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'utils'))
 
-from utils.database import get_bigquery_client
+from utils.database import get_bigquery_client, queries_to_polars
 from utils.data_processing import safe_aggregate
+from utils.visualizations import POLARS_HASH_FUNCS
 
 st.set_page_config(page_title="Customer Analytics", page_icon="👥", layout="wide")
 
-@st.cache_data(ttl=1800)
+@st.cache_resource(ttl=1800)
 def get_customer_analytics_data():
     """Get comprehensive customer analytics data"""
     client = get_bigquery_client()
     if not client:
-        return None
+        raise RuntimeError("Could not connect to BigQuery")
     
-    try:
-        # Customer segmentation data
-        customer_query = """
-        SELECT 
-            customer_id,
-            customer_state,
-            customer_city,
-            total_orders,
-            total_spent,
-            avg_order_value,
-            avg_review_score,
-            customer_segment,
-            churn_risk_level,
-            satisfaction_tier,
-            predicted_annual_clv,
-            days_as_customer,
-            categories_purchased
-        FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-        WHERE total_orders > 0
-        ORDER BY total_spent DESC
-        """
-        
-        customer_result = client.query(customer_query).result()
-        customer_data = pl.from_pandas(customer_result.to_dataframe())
-        
-        # Segment summary
-        segment_query = """
-        SELECT 
-            customer_segment,
-            CAST(COUNT(*) AS INT64) as customer_count,
-            ROUND(SUM(total_spent), 2) as segment_revenue,
-            ROUND(AVG(total_spent), 2) as avg_customer_value,
-            ROUND(AVG(avg_order_value), 2) as avg_order_value,
-            ROUND(AVG(predicted_annual_clv), 2) as avg_clv
-        FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-        WHERE total_orders > 0 AND customer_segment IS NOT NULL
-        GROUP BY customer_segment
-        ORDER BY segment_revenue DESC
-        """
-        
-        segment_result = client.query(segment_query).result()
-        segment_data = pl.from_pandas(segment_result.to_dataframe())
-        
-        # Geographic distribution
-        geo_query = """
-        SELECT 
-            customer_state,
-            CAST(COUNT(*) AS INT64) as customer_count,
-            ROUND(SUM(total_spent), 2) as state_revenue,
-            ROUND(AVG(total_spent), 2) as avg_customer_value
-        FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-        WHERE total_orders > 0
-        GROUP BY customer_state
-        ORDER BY state_revenue DESC
-        LIMIT 10
-        """
-        
-        geo_result = client.query(geo_query).result()
-        geo_data = pl.from_pandas(geo_result.to_dataframe())
-        
-        return {
-            'customer_data': customer_data,
-            'segment_data': segment_data,
-            'geo_data': geo_data
+    # Portfolio KPIs, aggregated server-side instead of pulling every customer row
+    customer_totals_query = """
+    SELECT 
+        CAST(COUNT(*) AS INT64) as total_customers,
+        SUM(total_spent) as total_revenue,
+        AVG(predicted_annual_clv) as avg_clv,
+        AVG(total_orders) as avg_orders
+    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
+    WHERE total_orders > 0
+    """
+    
+    # VIP customers; ORDER BY with LIMIT runs as a top-k, not a full sort
+    top_customers_query = """
+    SELECT 
+        customer_id,
+        customer_state,
+        total_orders,
+        total_spent,
+        customer_segment,
+        predicted_annual_clv
+    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
+    WHERE total_orders > 0
+    ORDER BY total_spent DESC
+    LIMIT 20
+    """
+    
+    # Segment summary
+    segment_query = """
+    SELECT 
+        customer_segment,
+        CAST(COUNT(*) AS INT64) as customer_count,
+        ROUND(SUM(total_spent), 2) as segment_revenue,
+        ROUND(AVG(total_spent), 2) as avg_customer_value,
+        ROUND(AVG(avg_order_value), 2) as avg_order_value,
+        ROUND(AVG(predicted_annual_clv), 2) as avg_clv
+    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
+    WHERE total_orders > 0 AND customer_segment IS NOT NULL
+    GROUP BY customer_segment
+    ORDER BY segment_revenue DESC
+    """
+    
+    # Geographic distribution
+    geo_query = """
+    SELECT 
+        customer_state,
+        CAST(COUNT(*) AS INT64) as customer_count,
+        ROUND(SUM(total_spent), 2) as state_revenue,
+        ROUND(AVG(total_spent), 2) as avg_customer_value
+    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
+    WHERE total_orders > 0
+    GROUP BY customer_state
+    ORDER BY state_revenue DESC
+    LIMIT 10
+    """
+    
+    # Independent queries are submitted together and run concurrently
+    return queries_to_polars(client, {
+        'customer_totals': customer_totals_query,
+        'top_customers': top_customers_query,
+        'segment_data': segment_query,
+        'geo_data': geo_query
+    })
+
+# Figure caches expire with the data loader so figures from a previous refresh are released
+@st.cache_resource(ttl=1800, max_entries=8, hash_funcs=POLARS_HASH_FUNCS)
+def build_segment_revenue_pie(segment_data: pl.DataFrame) -> go.Figure:
+    """Segment revenue pie chart, cached on segment data content"""
+    fig = px.pie(
+        segment_data,
+        values='segment_revenue',
+        names='customer_segment',
+        title='Revenue Distribution by Customer Segment',
+        color_discrete_sequence=px.colors.qualitative.Set3
+    )
+    fig.update_layout(height=400)
+    return fig
+
+@st.cache_resource(ttl=1800, max_entries=8, hash_funcs=POLARS_HASH_FUNCS)
+def build_segment_count_bar(segment_data: pl.DataFrame) -> go.Figure:
+    """Customer count by segment bar chart, cached on segment data content"""
+    fig = px.bar(
+        segment_data,
+        x='customer_segment',
+        y='customer_count',
+        title='Customer Count by Segment',
+        color='customer_segment',
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
+@st.cache_resource(ttl=1800, max_entries=8, hash_funcs=POLARS_HASH_FUNCS)
+def build_state_bar(geo_data: pl.DataFrame, y: str, title: str, color_scale: str) -> go.Figure:
+    """Top states bar chart, cached on geographic data content"""
+    fig = px.bar(
+        geo_data,
+        x='customer_state',
+        y=y,
+        title=title,
+        color=y,
+        color_continuous_scale=color_scale
+    )
+    fig.update_layout(height=400)
+    return fig
+
+@st.cache_resource(ttl=1800, max_entries=8, hash_funcs=POLARS_HASH_FUNCS)
+def build_clv_scatter(top_customers: pl.DataFrame) -> go.Figure:
+    """Customer value vs predicted CLV scatter, cached on customer data content"""
+    fig = px.scatter(
+        top_customers,
+        x='total_spent',
+        y='predicted_annual_clv',
+        color='customer_segment',
+        size='total_orders',
+        title='Customer Value vs Predicted CLV',
+        labels={
+            'total_spent': 'Total Spent ($)',
+            'predicted_annual_clv': 'Predicted CLV ($)'
         }
-        
-    except Exception as e:
-        st.error(f"Error loading customer analytics: {str(e)}")
-        return None
+    )
+    fig.update_layout(height=400)
+    return fig
 
+METRIC_CARD_COLORS = {
+    "primary": {
+        "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
+    },
+    "success": {
+        "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
+        "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
+    },
+    "warning": {
+        "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
+    },
+    "info": {
+        "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
+        "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
+    }
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_metric_card(title, value, icon, color="primary", subtitle=""):
     """Create a metric card with enhanced styling"""
-    color_schemes = {
-        "primary": {
-            "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-            "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
-        },
-        "success": {
-            "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
-            "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
-        },
-        "warning": {
-            "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
-            "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
-        },
-        "info": {
-            "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
-            "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
-        }
-    }
-    
-    selected_color = color_schemes.get(color, color_schemes["primary"])
+    # Memoized per card arguments so reruns reuse the rendered HTML
+    selected_color = METRIC_CARD_COLORS.get(color, METRIC_CARD_COLORS["primary"])
     
     return f"""
     <div style="
@@ -154,13 +210,15 @@ def main():
     
     # Load data
     with st.spinner("Loading customer analytics..."):
-        data = get_customer_analytics_data()
-    
-    if not data:
-        st.error("Unable to load customer analytics data.")
-        return
+        # Load failures raise instead of being cached, so the next rerun retries the queries
+        try:
+            data = get_customer_analytics_data()
+        except Exception as e:
+            st.error(f"Error loading customer analytics: {str(e)}")
+            return
     
-    customer_data = data['customer_data']
+    customer_totals = data['customer_totals']
+    top_customers = data['top_customers']
     segment_data = data['segment_data']
     geo_data = data['geo_data']
     
@@ -168,10 +226,12 @@ def main():
     st.header("📊 Customer Portfolio Overview")
     st.markdown("### Core Customer Metrics")
     
-    total_customers = customer_data.height
-    total_revenue = safe_aggregate(customer_data, pl.sum("total_spent"))
-    avg_clv = safe_aggregate(customer_data, pl.mean("predicted_annual_clv"))
-    avg_orders = safe_aggregate(customer_data, pl.mean("total_orders"))
+    # Portfolio KPIs arrive pre-aggregated as a single row
+    customer_metrics = customer_totals.row(0, named=True) if not customer_totals.is_empty() else {}
+    total_customers = customer_metrics.get("total_customers") or 0
+    total_revenue = customer_metrics.get("total_revenue") or 0
+    avg_clv = customer_metrics.get("avg_clv") or 0
+    avg_orders = customer_metrics.get("avg_orders") or 0
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -219,29 +279,11 @@ def main():
         
         with col1:
             # Segment revenue pie chart
-            segment_pd = segment_data.to_pandas()
-            fig_pie = px.pie(
-                segment_pd,
-                values='segment_revenue',
-                names='customer_segment',
-                title='Revenue Distribution by Customer Segment',
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig_pie.update_layout(height=400)
-            st.plotly_chart(fig_pie, width="stretch")
+            st.plotly_chart(build_segment_revenue_pie(segment_data), width="stretch")
         
         with col2:
             # Customer count by segment
-            fig_bar = px.bar(
-                segment_pd,
-                x='customer_segment',
-                y='customer_count',
-                title='Customer Count by Segment',
-                color='customer_segment',
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            fig_bar.update_layout(height=400, showlegend=False)
-            st.plotly_chart(fig_bar, width="stretch")
+            st.plotly_chart(build_segment_count_bar(segment_data), width="stretch")
     
     # Segment Performance Table
     st.subheader("📈 Segment Performance Metrics")
@@ -250,13 +292,19 @@ def main():
         segment_display = segment_data.select([
             pl.col("customer_segment").alias("Segment"),
             pl.col("customer_count").alias("Customers"),
-            pl.col("segment_revenue").map_elements(lambda x: f"${x:,.0f}", return_dtype=pl.String).alias("Revenue"),
-            pl.col("avg_customer_value").map_elements(lambda x: f"${x:.2f}", return_dtype=pl.String).alias("Avg Customer Value"),
-            pl.col("avg_order_value").map_elements(lambda x: f"${x:.2f}", return_dtype=pl.String).alias("Avg Order Value"),
-            pl.col("avg_clv").map_elements(lambda x: f"${x:,.0f}", return_dtype=pl.String).alias("Predicted CLV")
+            pl.col("segment_revenue").alias("Revenue"),
+            pl.col("avg_customer_value").alias("Avg Customer Value"),
+            pl.col("avg_order_value").alias("Avg Order Value"),
+            pl.col("avg_clv").alias("Predicted CLV")
         ])
         
-        st.dataframe(segment_display, width="stretch")
+        # Columns stay numeric so they sort correctly; Streamlit formats them for display
+        st.dataframe(segment_display, width="stretch", column_config={
+            "Revenue": st.column_config.NumberColumn(format="$%.0f"),
+            "Avg Customer Value": st.column_config.NumberColumn(format="$%.2f"),
+            "Avg Order Value": st.column_config.NumberColumn(format="$%.2f"),
+            "Predicted CLV": st.column_config.NumberColumn(format="$%.0f")
+        })
     
     # Geographic Analysis
     st.header("🗺️ Geographic Customer Distribution")
@@ -266,38 +314,20 @@ def main():
         
         with col1:
             # Top states by revenue
-            geo_pd = geo_data.to_pandas()
-            fig_geo = px.bar(
-                geo_pd,
-                x='customer_state',
-                y='state_revenue',
-                title='Top 10 States by Customer Revenue',
-                color='state_revenue',
-                color_continuous_scale='Blues'
-            )
-            fig_geo.update_layout(height=400)
-            st.plotly_chart(fig_geo, width="stretch")
+            st.plotly_chart(build_state_bar(
+                geo_data, 'state_revenue', 'Top 10 States by Customer Revenue', 'Blues'
+            ), width="stretch")
         
         with col2:
             # Customer count by state
-            fig_count = px.bar(
-                geo_pd,
-                x='customer_state',
-                y='customer_count',
-                title='Customer Count by State',
-                color='customer_count',
-                color_continuous_scale='Greens'
-            )
-            fig_count.update_layout(height=400)
-            st.plotly_chart(fig_count, width="stretch")
+            st.plotly_chart(build_state_bar(
+                geo_data, 'customer_count', 'Customer Count by State', 'Greens'
+            ), width="stretch")
     
     # Top Customers Analysis
     st.header("🏆 VIP Customer Analysis")
     
-    if not customer_data.is_empty():
-        # Top 20 customers
-        top_customers = customer_data.head(20)
-        
+    if not top_customers.is_empty():
         col1, col2 = st.columns(2)
         
         with col1:
@@ -306,38 +336,28 @@ def main():
             top_display = top_customers.select([
                 pl.col("customer_id").alias("Customer ID"),
                 pl.col("customer_state").alias("State"),
-                pl.col("total_spent").map_elements(lambda x: f"${x:.2f}", return_dtype=pl.String).alias("Total Spent"),
+                pl.col("total_spent").alias("Total Spent"),
                 pl.col("total_orders").alias("Orders"),
                 pl.col("customer_segment").alias("Segment")
             ]).head(10)
             
-            st.dataframe(top_display, width="stretch")
+            st.dataframe(top_display, width="stretch", column_config={
+                "Total Spent": st.column_config.NumberColumn(format="$%.2f")
+            })
         
         with col2:
             # CLV vs Spending scatter plot
-            top_pd = top_customers.to_pandas()
-            fig_scatter = px.scatter(
-                top_pd,
-                x='total_spent',
-                y='predicted_annual_clv',
-                color='customer_segment',
-                size='total_orders',
-                title='Customer Value vs Predicted CLV',
-                labels={
-                    'total_spent': 'Total Spent ($)',
-                    'predicted_annual_clv': 'Predicted CLV ($)'
-                }
-            )
-            fig_scatter.update_layout(height=400)
-            st.plotly_chart(fig_scatter, width="stretch")
+            st.plotly_chart(build_clv_scatter(top_customers), width="stretch")
     
     # Quick Stats Summary
     if not segment_data.is_empty():
         st.header("📋 Key Performance Indicators")
         
         # Calculate some KPIs
-        vip_filter = segment_data.filter(pl.col("customer_segment").str.contains("VIP|High")) if not segment_data.is_empty() else pl.DataFrame()
-        vip_customers = safe_aggregate(vip_filter, pl.sum("customer_count"))
+        vip_customers = safe_aggregate(
+            segment_data,
+            pl.col("customer_count").filter(pl.col("customer_segment").str.contains("VIP|High")).sum()
+        )
         vip_percentage = (vip_customers / total_customers * 100) if total_customers > 0 else 0
         
         col1, col2, col3, col4 = st.columns(4)
@@ -350,7 +370,8 @@ def main():
             st.metric("Avg Customer Value", f"${avg_customer_value:.2f}", "Growing")
         
         with col3:
-            top_state_revenue = safe_aggregate(geo_data, pl.max("state_revenue"))
+            # geo_data arrives sorted by revenue, so the leader is simply the first row
+            top_state_revenue = (geo_data["state_revenue"][0] or 0) if not geo_data.is_empty() else 0
             st.metric("Top State Revenue", f"${top_state_revenue:,.0f}", "São Paulo leader")
         
         with col4:
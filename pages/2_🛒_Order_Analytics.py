@@ -7,7 +7,8 @@ import streamlit as st
 import polars as pl
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
 import calendar
 import sys
 import os
@@ -15,138 +16,295 @@ import os
 # Add utils to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'utils'))
 
-from utils.database import get_bigquery_client
-from utils.data_processing import safe_aggregate, safe_item
+from utils.database import get_bigquery_client, execute_query
+from utils.visualizations import POLARS_HASH_FUNCS, build_bar_chart, build_pie_chart
+from utils.data_processing import split_result_sets, select_result_set
 
 st.set_page_config(page_title="Order Analytics", page_icon="🛒", layout="wide")
 
-@st.cache_data(ttl=1800)
-def get_order_analytics_data():
-    """Get comprehensive order analytics data using revenue_analytics_obt"""
+def get_order_date_bounds() -> Optional[Tuple[date, date]]:
+    """Get the first and last order dates available for the date range filter"""
+    bounds_query = """
+    SELECT 
+        MIN(order_date) as min_date,
+        MAX(order_date) as max_date
+    FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
+    WHERE order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
+    """
+    
+    bounds = execute_query(bounds_query, "Order Date Bounds")
+    if bounds.is_empty():
+        return None
+    
+    min_date, max_date = bounds.row(0)
+    if min_date is None or max_date is None:
+        return None
+    return min_date, max_date
+
+def get_order_analytics_data(start_date: date, end_date: date, approximate_counts: bool = False):
+    """Get comprehensive order analytics data using revenue_analytics_obt
+    
+    Not cached as a whole: execute_query caches each result keyed on its SQL text,
+    so editing the page-level code does not discard unchanged query results.
+    """
     client = get_bigquery_client()
     if not client:
         st.error("Failed to connect to BigQuery")
         return None
     
     try:
-        # Order metrics query using revenue_analytics_obt
-        order_query = """
-        SELECT 
-            order_id,
-            customer_id,
-            order_status,
-            order_date,
-            product_id,
-            product_category_english as product_category_name,
-            seller_id,
-            seller_state,
-            seller_city,
-            item_price as price,
-            freight_cost as freight_value,
-            payment_type,
-            payment_installments,
-            allocated_payment as payment_value,
-            review_score,
-            year_month,
-            satisfaction_level,
-            shipping_complexity
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
-        ORDER BY order_date DESC
-        LIMIT 50000
+        # Every panel on the page is an aggregate, so all of them are computed in one job:
+        # a single scan of the filtered table, with each result set tagged by result_type.
+        # Each CTE shares one column layout (NULL-padded) so they can be combined with UNION ALL.
+        # APPROX_COUNT_DISTINCT (HyperLogLog++, ~1% error) is much cheaper than exact distinct counts
+        if approximate_counts:
+            order_count, customer_count = "APPROX_COUNT_DISTINCT(order_id)", "APPROX_COUNT_DISTINCT(customer_id)"
+        else:
+            order_count, customer_count = "COUNT(DISTINCT order_id)", "COUNT(DISTINCT customer_id)"
+        
+        summary_query = f"""
+        WITH base AS (
+            SELECT 
+                order_id,
+                customer_id,
+                order_status,
+                year_month,
+                product_category_english,
+                satisfaction_level,
+                seller_state,
+                payment_type,
+                payment_installments,
+                allocated_payment,
+                review_score
+            FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
+            WHERE order_date BETWEEN @start_date AND @end_date
+                AND order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
+        ),
+        totals AS (
+            SELECT 
+                1 as sort_rank,
+                CAST(NULL AS STRING) as label,
+                CAST({order_count} AS INT64) as order_count,
+                ROUND(SUM(allocated_payment), 2) as revenue,
+                ROUND(AVG(allocated_payment), 2) as avg_order_value,
+                CAST({customer_count} AS INT64) as unique_customers,
+                CAST(NULL AS FLOAT64) as avg_review_score,
+                -- Share of delivered orders with high satisfaction, for the insights row
+                ROUND(COUNT(DISTINCT IF(order_status = 'delivered' AND satisfaction_level = 'high', order_id, NULL)) * 100.0
+                    / NULLIF(COUNT(DISTINCT IF(order_status = 'delivered' AND satisfaction_level IS NOT NULL, order_id, NULL)), 0), 2) as percentage,
+                ROUND(AVG(payment_installments), 2) as avg_installments
+            FROM base
+        ),
+        monthly AS (
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY year_month) as sort_rank,
+                year_month as label,
+                CAST({order_count} AS INT64) as order_count,
+                ROUND(SUM(allocated_payment), 2) as revenue,
+                ROUND(AVG(allocated_payment), 2) as avg_order_value,
+                CAST({customer_count} AS INT64) as unique_customers,
+                CAST(NULL AS FLOAT64) as avg_review_score,
+                -- Month-over-month revenue growth
+                ROUND((SUM(allocated_payment) - LAG(SUM(allocated_payment)) OVER (ORDER BY year_month))
+                    / NULLIF(LAG(SUM(allocated_payment)) OVER (ORDER BY year_month), 0) * 100, 2) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            GROUP BY year_month
+        ),
+        category AS (
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY SUM(allocated_payment) DESC) as sort_rank,
+                product_category_english as label,
+                CAST({order_count} AS INT64) as order_count,
+                ROUND(SUM(allocated_payment), 2) as revenue,
+                ROUND(AVG(allocated_payment), 2) as avg_order_value,
+                CAST(NULL AS INT64) as unique_customers,
+                ROUND(AVG(review_score), 2) as avg_review_score,
+                CAST(NULL AS FLOAT64) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            WHERE order_status = 'delivered' AND product_category_english IS NOT NULL
+            GROUP BY product_category_english
+            QUALIFY sort_rank <= 15
+        ),
+        delivery AS (
+            -- Delivery performance (using available satisfaction_level)
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY {order_count} DESC) as sort_rank,
+                satisfaction_level as label,
+                CAST({order_count} AS INT64) as order_count,
+                CAST(NULL AS FLOAT64) as revenue,
+                CAST(NULL AS FLOAT64) as avg_order_value,
+                CAST(NULL AS INT64) as unique_customers,
+                ROUND(AVG(review_score), 2) as avg_review_score,
+                ROUND({order_count} * 100.0 / SUM({order_count}) OVER(), 2) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            WHERE order_status = 'delivered' AND satisfaction_level IS NOT NULL
+            GROUP BY satisfaction_level
+        ),
+        payment AS (
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY SUM(allocated_payment) DESC) as sort_rank,
+                payment_type as label,
+                CAST({order_count} AS INT64) as order_count,
+                ROUND(SUM(allocated_payment), 2) as revenue,
+                ROUND(AVG(allocated_payment), 2) as avg_order_value,
+                CAST(NULL AS INT64) as unique_customers,
+                CAST(NULL AS FLOAT64) as avg_review_score,
+                CAST(NULL AS FLOAT64) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            GROUP BY payment_type
+        ),
+        installments AS (
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY payment_installments) as sort_rank,
+                CAST(payment_installments AS STRING) as label,
+                CAST({order_count} AS INT64) as order_count,
+                CAST(NULL AS FLOAT64) as revenue,
+                ROUND(AVG(allocated_payment), 2) as avg_order_value,
+                CAST(NULL AS INT64) as unique_customers,
+                CAST(NULL AS FLOAT64) as avg_review_score,
+                CAST(NULL AS FLOAT64) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            GROUP BY payment_installments
+            QUALIFY sort_rank <= 10
+        ),
+        state AS (
+            SELECT 
+                ROW_NUMBER() OVER (ORDER BY SUM(allocated_payment) DESC) as sort_rank,
+                seller_state as label,
+                CAST({order_count} AS INT64) as order_count,
+                ROUND(SUM(allocated_payment), 2) as revenue,
+                CAST(NULL AS FLOAT64) as avg_order_value,
+                CAST(NULL AS INT64) as unique_customers,
+                ROUND(AVG(review_score), 2) as avg_review_score,
+                CAST(NULL AS FLOAT64) as percentage,
+                CAST(NULL AS FLOAT64) as avg_installments
+            FROM base
+            GROUP BY seller_state
+            QUALIFY sort_rank <= 15
+        )
+        SELECT 'totals' as result_type, * FROM totals
+        UNION ALL SELECT 'monthly' as result_type, * FROM monthly
+        UNION ALL SELECT 'category' as result_type, * FROM category
+        UNION ALL SELECT 'delivery' as result_type, * FROM delivery
+        UNION ALL SELECT 'payment' as result_type, * FROM payment
+        UNION ALL SELECT 'installments' as result_type, * FROM installments
+        UNION ALL SELECT 'state' as result_type, * FROM state
+        ORDER BY result_type, sort_rank
         """
         
-        order_result = client.query(order_query).result()
-        order_data = pl.from_pandas(order_result.to_dataframe())
+        date_params = (("start_date", "DATE", start_date), ("end_date", "DATE", end_date))
+        result_sets = split_result_sets(execute_query(summary_query, "Order Summary", date_params))
+        
+        totals_data = select_result_set(result_sets, 'totals', [
+            pl.col("order_count").alias("total_orders"),
+            pl.col("revenue").alias("total_revenue"),
+            pl.col("avg_order_value"),
+            pl.col("unique_customers"),
+            pl.col("avg_installments"),
+            pl.col("percentage").alias("high_satisfaction_rate")
+        ])
         
-        if order_data.is_empty():
+        if totals_data.is_empty():
             st.warning("No order data found")
             return None
         
-        # Monthly trends
-        monthly_query = """
-        SELECT 
-            year_month,
-            CAST(COUNT(DISTINCT order_id) AS INT64) as order_count,
-            ROUND(SUM(allocated_payment), 2) as total_revenue,
-            ROUND(AVG(allocated_payment), 2) as avg_order_value,
-            CAST(COUNT(DISTINCT customer_id) AS INT64) as unique_customers
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_status IN ('delivered', 'shipped', 'invoiced', 'processing')
-        GROUP BY year_month
-        ORDER BY year_month
-        """
-        
-        monthly_result = client.query(monthly_query).result()
-        monthly_data = pl.from_pandas(monthly_result.to_dataframe())
-        
-        # Category performance
-        category_query = """
-        SELECT 
-            product_category_english as product_category_name,
-            CAST(COUNT(DISTINCT order_id) AS INT64) as order_count,
-            ROUND(SUM(allocated_payment), 2) as category_revenue,
-            ROUND(AVG(allocated_payment), 2) as avg_order_value,
-            ROUND(AVG(review_score), 2) as avg_review_score
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_status = 'delivered' AND product_category_english IS NOT NULL
-        GROUP BY product_category_english
-        ORDER BY category_revenue DESC
-        LIMIT 15
-        """
-        
-        category_result = client.query(category_query).result()
-        category_data = pl.from_pandas(category_result.to_dataframe())
-        
-        # Delivery performance (using available satisfaction_level)
-        delivery_query = """
-        SELECT 
-            satisfaction_level as delivery_performance,
-            CAST(COUNT(DISTINCT order_id) AS INT64) as order_count,
-            ROUND(AVG(review_score), 2) as avg_review_score,
-            ROUND(COUNT(DISTINCT order_id) * 100.0 / SUM(COUNT(DISTINCT order_id)) OVER(), 2) as percentage
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE order_status = 'delivered' AND satisfaction_level IS NOT NULL
-        GROUP BY satisfaction_level
-        ORDER BY order_count DESC
-        """
-        
-        delivery_result = client.query(delivery_query).result()
-        delivery_data = pl.from_pandas(delivery_result.to_dataframe())
+        monthly_data = select_result_set(result_sets, 'monthly', [
+            pl.col("label").alias("year_month"),
+            pl.col("order_count"),
+            pl.col("revenue").alias("total_revenue"),
+            pl.col("avg_order_value"),
+            pl.col("unique_customers"),
+            pl.col("percentage").alias("mom_growth")
+        ])
+        category_data = select_result_set(result_sets, 'category', [
+            pl.col("label").alias("product_category_name"),
+            pl.col("order_count"),
+            pl.col("revenue").alias("category_revenue"),
+            pl.col("avg_order_value"),
+            pl.col("avg_review_score")
+        ])
+        delivery_data = select_result_set(result_sets, 'delivery', [
+            pl.col("label").alias("delivery_performance"),
+            pl.col("order_count"),
+            pl.col("avg_review_score"),
+            pl.col("percentage")
+        ])
+        payment_data = select_result_set(result_sets, 'payment', [
+            pl.col("label").alias("payment_type"),
+            pl.col("order_count"),
+            pl.col("revenue").alias("total_revenue"),
+            pl.col("avg_order_value").alias("avg_payment")
+        ])
+        installment_data = select_result_set(result_sets, 'installments', [
+            pl.col("label").cast(pl.Int64).alias("payment_installments"),
+            pl.col("order_count"),
+            pl.col("avg_order_value").alias("avg_payment")
+        ])
+        state_data = select_result_set(result_sets, 'state', [
+            pl.col("label").alias("seller_state"),
+            pl.col("order_count"),
+            pl.col("revenue").alias("total_revenue"),
+            pl.col("avg_review_score").alias("avg_review")
+        ])
         
         return {
-            'order_data': order_data,
+            'totals_data': totals_data,
             'monthly_data': monthly_data,
             'category_data': category_data,
-            'delivery_data': delivery_data
+            'delivery_data': delivery_data,
+            'payment_data': payment_data,
+            'installment_data': installment_data,
+            'state_data': state_data
         }
         
     except Exception as e:
         st.error(f"Error loading order analytics: {str(e)}")
         return None
 
+# Keyed on the aggregates, which vary with the date range and count mode; the bounds evict
+# figures for past selections. Bar and pie builders are shared from utils.visualizations
+@st.cache_resource(ttl=1800, max_entries=24, hash_funcs=POLARS_HASH_FUNCS)
+def build_line_chart(data: pl.DataFrame, x: str, y: str, title: str, line_color: str) -> go.Figure:
+    """Single-series line chart, cached on data content"""
+    # Built from column arrays directly; px only adds per-row trace mapping for one series
+    fig = go.Figure(go.Scatter(
+        x=data[x].to_list(),
+        y=data[y].to_numpy(),
+        mode='lines',
+        line=dict(color=line_color)
+    ))
+    fig.update_layout(title=title, height=400, xaxis_title=x, yaxis_title=y)
+    return fig
+
+METRIC_CARD_COLORS = {
+    "primary": {
+        "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
+    },
+    "success": {
+        "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
+        "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
+    },
+    "warning": {
+        "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
+    },
+    "info": {
+        "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
+        "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
+    }
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_metric_card(title, value, icon, color="primary", subtitle=""):
     """Create a metric card with enhanced styling"""
-    color_schemes = {
-        "primary": {
-            "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-            "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
-        },
-        "success": {
-            "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
-            "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
-        },
-        "warning": {
-            "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
-            "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
-        },
-        "info": {
-            "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
-            "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
-        }
-    }
-    
-    selected_color = color_schemes.get(color, color_schemes["primary"])
+    # Memoized per card arguments so reruns reuse the rendered HTML
+    selected_color = METRIC_CARD_COLORS.get(color, METRIC_CARD_COLORS["primary"])
     
     return f"""
     <div style="
@@ -181,293 +339,232 @@ def main():
     st.title("🛒 Order Analytics")
     st.markdown("**Deep Analysis of Order Trends and Performance**")
     
+    # Date range filter, pushed down into the SQL as query parameters
+    date_bounds = get_order_date_bounds()
+    if not date_bounds:
+        st.error("Unable to load order analytics data. Please check your database connection and try again.")
+        return
+    
+    min_date, max_date = date_bounds
+    # Submitted as one form so the summary query reruns once per change, not per widget
+    with st.sidebar.form("order_filters"):
+        date_range = st.date_input(
+            "Order Date Range",
+            value=(min_date, max_date),
+            min_value=min_date,
+            max_value=max_date
+        )
+        approximate_counts = st.checkbox(
+            "Approximate distinct counts",
+            value=False,
+            help="Faster, cheaper queries with roughly 1% error on order and customer counts"
+        )
+        st.form_submit_button("Apply")
+    # The widget returns a single date if only one end of the range was picked
+    start_date, end_date = date_range if len(date_range) == 2 else (min_date, max_date)
+    
     # Load data
     with st.spinner("Loading order analytics..."):
-        data = get_order_analytics_data()
+        data = get_order_analytics_data(start_date, end_date, approximate_counts)
     
     if not data:
         st.error("Unable to load order analytics data. Please check your database connection and try again.")
         st.info("Debug info: Make sure BigQuery credentials are properly configured.")
         return
     
-    order_data = data['order_data']
+    totals_data = data['totals_data']
     monthly_data = data['monthly_data']
     category_data = data['category_data']
     delivery_data = data['delivery_data']
+    payment_data = data['payment_data']
+    installment_data = data['installment_data']
+    state_data = data['state_data']
     
     # Check if we have any data
-    if order_data.is_empty():
+    if totals_data.is_empty():
         st.warning("No order data available for analysis.")
         return
     
+    # Checked once; several sections below depend on the same frames
+    has_monthly = not monthly_data.is_empty()
+    has_categories = not category_data.is_empty()
+    has_delivery = not delivery_data.is_empty()
+    
     # Overall Order Metrics
     st.header("📊 Order Performance Overview")
     st.markdown("### Core Order Metrics")
     
-    if not order_data.is_empty():
-        total_orders = safe_aggregate(order_data, pl.n_unique("order_id"))
-        total_revenue = safe_aggregate(order_data, pl.sum("payment_value"))
-        avg_order_value = safe_aggregate(order_data, pl.mean("payment_value"))
-        unique_customers = safe_aggregate(order_data, pl.n_unique("customer_id"))
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(create_metric_card(
-                "Total Orders", 
-                f"{int(total_orders):,}", 
-                "🛒",
-                "primary",
-                "Completed Transactions"
-            ), unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(create_metric_card(
-                "Total Revenue", 
-                f"${total_revenue:,.0f}", 
-                "💰",
-                "success",
-                "Order Generated Revenue"
-            ), unsafe_allow_html=True)
-        
-        with col3:
-            st.markdown(create_metric_card(
-                "Avg Order Value", 
-                f"${avg_order_value:.2f}", 
-                "📈",
-                "warning",
-                "Revenue per Order"
-            ), unsafe_allow_html=True)
-        
-        with col4:
-            st.markdown(create_metric_card(
-                "Unique Customers", 
-                f"{int(unique_customers):,}", 
-                "👥",
-                "info",
-                "Active Order Customers"
-            ), unsafe_allow_html=True)
+    # Top-line KPIs arrive pre-aggregated as a single row
+    order_metrics = totals_data.row(0, named=True)
+    total_orders = order_metrics["total_orders"] or 0
+    total_revenue = order_metrics["total_revenue"] or 0
+    avg_order_value = order_metrics["avg_order_value"] or 0
+    unique_customers = order_metrics["unique_customers"] or 0
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.markdown(create_metric_card(
+            "Total Orders", 
+            f"{int(total_orders):,}", 
+            "🛒",
+            "primary",
+            "Completed Transactions"
+        ), unsafe_allow_html=True)
+    
+    with col2:
+        st.markdown(create_metric_card(
+            "Total Revenue", 
+            f"${total_revenue:,.0f}", 
+            "💰",
+            "success",
+            "Order Generated Revenue"
+        ), unsafe_allow_html=True)
+    
+    with col3:
+        st.markdown(create_metric_card(
+            "Avg Order Value", 
+            f"${avg_order_value:.2f}", 
+            "📈",
+            "warning",
+            "Revenue per Order"
+        ), unsafe_allow_html=True)
+    
+    with col4:
+        st.markdown(create_metric_card(
+            "Unique Customers", 
+            f"{int(unique_customers):,}", 
+            "👥",
+            "info",
+            "Active Order Customers"
+        ), unsafe_allow_html=True)
     
     # Monthly Trends Analysis
     st.header("📈 Order Trends Over Time")
     
-    if not monthly_data.is_empty():
+    if has_monthly:
         col1, col2 = st.columns(2)
         
         with col1:
             # Monthly order count
-            monthly_pd = monthly_data.to_pandas()
-            fig_orders = px.line(
-                monthly_pd,
-                x='year_month',
-                y='order_count',
-                title='Monthly Order Count Trend',
-                color_discrete_sequence=['#1f77b4']
-            )
-            fig_orders.update_layout(height=400)
-            st.plotly_chart(fig_orders, width="stretch")
+            st.plotly_chart(build_line_chart(
+                monthly_data, 'year_month', 'order_count', 'Monthly Order Count Trend', '#1f77b4'
+            ), width="stretch")
         
         with col2:
             # Monthly revenue
-            fig_revenue = px.line(
-                monthly_pd,
-                x='year_month',
-                y='total_revenue',
-                title='Monthly Revenue Trend',
-                color_discrete_sequence=['#2ca02c']
-            )
-            fig_revenue.update_layout(height=400)
-            st.plotly_chart(fig_revenue, width="stretch")
+            st.plotly_chart(build_line_chart(
+                monthly_data, 'year_month', 'total_revenue', 'Monthly Revenue Trend', '#2ca02c'
+            ), width="stretch")
         
         # Average order value trend
-        fig_aov = px.line(
-            monthly_pd,
-            x='year_month',
-            y='avg_order_value',
-            title='Average Order Value Trend',
-            color_discrete_sequence=['#ff7f0e']
-        )
-        fig_aov.update_layout(height=400)
-        st.plotly_chart(fig_aov, width="stretch")
+        st.plotly_chart(build_line_chart(
+            monthly_data, 'year_month', 'avg_order_value', 'Average Order Value Trend', '#ff7f0e'
+        ), width="stretch")
     
     # Category Performance Analysis
     st.header("🏷️ Product Category Performance")
     
-    if not category_data.is_empty():
+    if has_categories:
+        top_categories = category_data.head(10)
         col1, col2 = st.columns(2)
         
         with col1:
             # Top categories by revenue
-            category_pd = category_data.head(10).to_pandas()
-            fig_cat_revenue = px.bar(
-                category_pd,
-                x='category_revenue',
-                y='product_category_name',
-                orientation='h',
-                title='Top 10 Categories by Revenue',
-                color='category_revenue',
-                color_continuous_scale='Blues'
-            )
-            fig_cat_revenue.update_layout(height=500)
-            st.plotly_chart(fig_cat_revenue, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                top_categories, 'category_revenue', 'product_category_name', 'Top 10 Categories by Revenue', 'Blues',
+                orientation='h', height=500
+            ), use_container_width=True)
         
         with col2:
             # Category order count
-            fig_cat_orders = px.bar(
-                category_pd,
-                x='order_count',
-                y='product_category_name',
-                orientation='h',
-                title='Top 10 Categories by Order Count',
-                color='order_count',
-                color_continuous_scale='Greens'
-            )
-            fig_cat_orders.update_layout(height=500)
-            st.plotly_chart(fig_cat_orders, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                top_categories, 'order_count', 'product_category_name', 'Top 10 Categories by Order Count', 'Greens',
+                orientation='h', height=500
+            ), use_container_width=True)
     
     # Category Performance Table
     st.subheader("📊 Category Performance Metrics")
     
-    if not category_data.is_empty():
+    if has_categories:
         category_display = category_data.head(10).select([
             pl.col("product_category_name").alias("Category"),
             pl.col("order_count").alias("Orders"),
-            pl.col("category_revenue").map_elements(lambda x: f"${x:,.0f}", return_dtype=pl.String).alias("Revenue"),
-            pl.col("avg_order_value").map_elements(lambda x: f"${x:.2f}", return_dtype=pl.String).alias("Avg Order Value"),
-            pl.col("avg_review_score").map_elements(lambda x: f"{x:.2f}⭐", return_dtype=pl.String).alias("Avg Review")
+            pl.col("category_revenue").alias("Revenue"),
+            pl.col("avg_order_value").alias("Avg Order Value"),
+            pl.col("avg_review_score").alias("Avg Review")
         ])
         
-        st.dataframe(category_display, use_container_width=True)
+        # Columns stay numeric so they sort correctly; Streamlit formats them for display
+        st.dataframe(category_display, use_container_width=True, column_config={
+            "Revenue": st.column_config.NumberColumn(format="$%.0f"),
+            "Avg Order Value": st.column_config.NumberColumn(format="$%.2f"),
+            "Avg Review": st.column_config.NumberColumn(format="%.2f⭐")
+        })
     
     # Delivery Performance Analysis
     st.header("🚚 Delivery Performance Analysis")
     
-    if not delivery_data.is_empty():
+    if has_delivery:
         col1, col2 = st.columns(2)
         
         with col1:
             # Delivery performance distribution
-            delivery_pd = delivery_data.to_pandas()
-            fig_delivery = px.pie(
-                delivery_pd,
-                values='order_count',
-                names='delivery_performance',
-                title='Delivery Performance Distribution',
-                color_discrete_sequence=px.colors.qualitative.Set3
-            )
-            fig_delivery.update_layout(height=400)
-            st.plotly_chart(fig_delivery, use_container_width=True)
+            st.plotly_chart(build_pie_chart(
+                delivery_data, 'order_count', 'delivery_performance', 'Delivery Performance Distribution', px.colors.qualitative.Set3
+            ), use_container_width=True)
         
         with col2:
             # Review scores by delivery performance
-            fig_review = px.bar(
-                delivery_pd,
-                x='delivery_performance',
-                y='avg_review_score',
-                title='Review Scores by Delivery Performance',
-                color='avg_review_score',
-                color_continuous_scale='RdYlGn'
-            )
-            fig_review.update_layout(height=400)
-            st.plotly_chart(fig_review, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                delivery_data, 'delivery_performance', 'avg_review_score', 'Review Scores by Delivery Performance', 'RdYlGn'
+            ), use_container_width=True)
     
     # Payment Analysis
     st.header("💳 Payment Analysis")
     
-    if not order_data.is_empty():
-        # Payment type distribution
-        payment_summary = order_data.group_by("payment_type").agg([
-            pl.count("order_id").alias("order_count"),
-            pl.sum("payment_value").alias("total_revenue"),
-            pl.mean("payment_value").alias("avg_payment")
-        ]).sort("total_revenue", descending=True)
-        
+    if not payment_data.is_empty():
         col1, col2 = st.columns(2)
         
         with col1:
             # Payment type revenue
-            payment_pd = payment_summary.to_pandas()
-            fig_payment = px.pie(
-                payment_pd,
-                values='total_revenue',
-                names='payment_type',
-                title='Revenue by Payment Type',
-                color_discrete_sequence=px.colors.qualitative.Pastel
-            )
-            fig_payment.update_layout(height=400)
-            st.plotly_chart(fig_payment, use_container_width=True)
+            st.plotly_chart(build_pie_chart(
+                payment_data, 'total_revenue', 'payment_type', 'Revenue by Payment Type', px.colors.qualitative.Pastel
+            ), use_container_width=True)
         
         with col2:
             # Installment analysis
-            installment_summary = order_data.group_by("payment_installments").agg([
-                pl.count("order_id").alias("order_count"),
-                pl.mean("payment_value").alias("avg_payment")
-            ]).sort("payment_installments")
-            
-            installment_pd = installment_summary.head(10).to_pandas()
-            fig_installments = px.bar(
-                installment_pd,
-                x='payment_installments',
-                y='order_count',
-                title='Order Count by Payment Installments',
-                color='order_count',
-                color_continuous_scale='Blues'
-            )
-            fig_installments.update_layout(height=400)
-            st.plotly_chart(fig_installments, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                installment_data, 'payment_installments', 'order_count', 'Order Count by Payment Installments', 'Blues'
+            ), use_container_width=True)
     
     # Geographic Analysis
     st.header("🗺️ Geographic Order Distribution")
     
-    if not order_data.is_empty():
-        # State-wise analysis
-        state_summary = order_data.group_by("seller_state").agg([
-            pl.count("order_id").alias("order_count"),
-            pl.sum("payment_value").alias("total_revenue"),
-            pl.mean("review_score").alias("avg_review")
-        ]).sort("total_revenue", descending=True).head(15)
-        
+    if not state_data.is_empty():
         col1, col2 = st.columns(2)
         
         with col1:
             # Top states by revenue
-            state_pd = state_summary.to_pandas()
-            fig_state_revenue = px.bar(
-                state_pd,
-                x='seller_state',
-                y='total_revenue',
-                title='Top 15 States by Revenue',
-                color='total_revenue',
-                color_continuous_scale='Viridis'
-            )
-            fig_state_revenue.update_layout(height=400)
-            st.plotly_chart(fig_state_revenue, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                state_data, 'seller_state', 'total_revenue', 'Top 15 States by Revenue', 'Viridis'
+            ), use_container_width=True)
         
         with col2:
             # State order count
-            fig_state_orders = px.bar(
-                state_pd,
-                x='seller_state',
-                y='order_count',
-                title='Order Count by State',
-                color='order_count',
-                color_continuous_scale='Plasma'
-            )
-            fig_state_orders.update_layout(height=400)
-            st.plotly_chart(fig_state_orders, use_container_width=True)
+            st.plotly_chart(build_bar_chart(
+                state_data, 'seller_state', 'order_count', 'Order Count by State', 'Plasma'
+            ), use_container_width=True)
     
     # Quick Order Insights
-    if not monthly_data.is_empty() and not category_data.is_empty():
+    if has_monthly and has_categories:
         st.header("📋 Key Order Insights")
         
         # Calculate insights
-        recent_growth = 0
-        if monthly_data.height >= 2:
-            latest_revenue = safe_item(monthly_data.tail(1).select("total_revenue"))
-            previous_revenue = safe_item(monthly_data.tail(2).head(1).select("total_revenue"))
-            recent_growth = ((latest_revenue - previous_revenue) / previous_revenue * 100) if previous_revenue > 0 else 0
+        # Growth and ranking are computed in SQL; the first month has no growth value
+        recent_growth = monthly_data.row(-1, named=True)["mom_growth"] or 0
         
-        top_category = safe_item(category_data.head(1).select("product_category_name"), "N/A")
+        top_category = category_data.row(0, named=True)["product_category_name"] or "N/A"
         
         col1, col2, col3, col4 = st.columns(4)
         
@@ -478,12 +575,11 @@ def main():
             st.metric("Top Category", top_category, "By revenue")
         
         with col3:
-            delivery_filter = delivery_data.filter(pl.col("delivery_performance") == "high") if not delivery_data.is_empty() else pl.DataFrame()
-            delivery_rate = safe_aggregate(delivery_filter, pl.col("percentage"))
+            delivery_rate = order_metrics["high_satisfaction_rate"] or 0
             st.metric("High Satisfaction", f"{delivery_rate:.1f}%", "Performance")
         
         with col4:
-            avg_installments = safe_aggregate(order_data, pl.mean("payment_installments"))
+            avg_installments = order_metrics["avg_installments"] or 0
             st.metric("Avg Installments", f"{avg_installments:.1f}", "Payment flexibility")
     
     # Footer
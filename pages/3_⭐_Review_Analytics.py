@@ -14,126 +14,218 @@ import os
 # Add utils to path
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'utils'))
 
-from utils.database import get_bigquery_client
-from utils.data_processing import safe_aggregate, safe_item
+from utils.database import get_bigquery_client, cached_query_to_polars
+from utils.data_processing import safe_aggregate, split_result_sets, select_result_set
 
 st.set_page_config(page_title="Review Analytics", page_icon="⭐", layout="wide")
 
-@st.cache_data(ttl=1800)
+@st.cache_resource(ttl=1800)
 def get_review_analytics_data():
     """Get comprehensive review analytics data"""
     client = get_bigquery_client()
     if not client:
-        return None
+        raise RuntimeError("Could not connect to BigQuery")
     
-    try:
-        # Review overview using both revenue and customer analytics tables
-        review_query = """
-        SELECT 
-            r.order_id,
-            r.customer_id,
-            r.product_category_english as product_category_name,
-            r.review_score,
-            r.seller_state,
-            r.allocated_payment as payment_value,
-            r.year_month,
-            r.customer_state,
-            r.satisfaction_level
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt` r
-        WHERE r.review_score IS NOT NULL
-        ORDER BY r.order_date DESC
-        LIMIT 100000
-        """
-        
-        review_result = client.query(review_query).result()
-        review_data = pl.from_pandas(review_result.to_dataframe())
-        
-        # Review trends by month
-        monthly_query = """
+    # All review panels are aggregates over the same table, so they are computed in one job:
+    # one scan, each result set tagged by result_type and NULL-padded to a shared layout.
+    summary_query = """
+    WITH base AS (
         SELECT 
+            review_score,
+            allocated_payment,
+            customer_id,
+            customer_state,
             year_month,
-            CAST(COUNT(*) AS INT64) as review_count,
-            ROUND(AVG(review_score), 2) as avg_review_score,
-            CAST(COUNT(CASE WHEN review_score >= 4 THEN 1 END) AS INT64) as positive_reviews,
-            CAST(COUNT(CASE WHEN review_score <= 2 THEN 1 END) AS INT64) as negative_reviews
+            product_category_english,
+            satisfaction_level
         FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE review_score IS NOT NULL
+    ),
+    reviews AS (
+        SELECT * FROM base WHERE review_score IS NOT NULL
+    ),
+    totals AS (
+        SELECT 
+            1 as sort_rank,
+            CAST(NULL AS STRING) as label,
+            CAST(COUNT(*) AS INT64) as item_count,
+            ROUND(AVG(review_score), 2) as avg_review_score,
+            CAST(COUNTIF(review_score >= 4) AS INT64) as positive_reviews,
+            CAST(COUNTIF(review_score <= 2) AS INT64) as negative_reviews,
+            CAST(NULL AS FLOAT64) as revenue,
+            CAST(NULL AS FLOAT64) as avg_value
+        FROM reviews
+    ),
+    score_distribution AS (
+        SELECT 
+            CAST(review_score AS INT64) as sort_rank,
+            CAST(NULL AS STRING) as label,
+            CAST(COUNT(*) AS INT64) as item_count,
+            CAST(NULL AS FLOAT64) as avg_review_score,
+            CAST(NULL AS INT64) as positive_reviews,
+            CAST(NULL AS INT64) as negative_reviews,
+            CAST(NULL AS FLOAT64) as revenue,
+            CAST(NULL AS FLOAT64) as avg_value
+        FROM reviews
+        GROUP BY review_score
+    ),
+    score_categories AS (
+        SELECT 
+            ROW_NUMBER() OVER (ORDER BY MIN(review_score)) as sort_rank,
+            CASE 
+                WHEN review_score >= 4 THEN 'Positive (4-5)'
+                WHEN review_score = 3 THEN 'Neutral (3)'
+                ELSE 'Negative (1-2)'
+            END as label,
+            CAST(COUNT(*) AS INT64) as item_count,
+            CAST(NULL AS FLOAT64) as avg_review_score,
+            CAST(NULL AS INT64) as positive_reviews,
+            CAST(NULL AS INT64) as negative_reviews,
+            CAST(NULL AS FLOAT64) as revenue,
+            CAST(NULL AS FLOAT64) as avg_value
+        FROM reviews
+        GROUP BY label
+    ),
+    state AS (
+        SELECT 
+            ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC) as sort_rank,
+            customer_state as label,
+            CAST(COUNT(*) AS INT64) as item_count,
+            ROUND(AVG(review_score), 2) as avg_review_score,
+            CAST(NULL AS INT64) as positive_reviews,
+            CAST(NULL AS INT64) as negative_reviews,
+            ROUND(SUM(allocated_payment), 2) as revenue,
+            CAST(NULL AS FLOAT64) as avg_value
+        FROM reviews
+        GROUP BY customer_state
+        QUALIFY sort_rank <= 15
+    ),
+    monthly AS (
+        SELECT 
+            ROW_NUMBER() OVER (ORDER BY year_month) as sort_rank,
+            year_month as label,
+            CAST(COUNT(*) AS INT64) as item_count,
+            ROUND(AVG(review_score), 2) as avg_review_score,
+            CAST(COUNTIF(review_score >= 4) AS INT64) as positive_reviews,
+            CAST(COUNTIF(review_score <= 2) AS INT64) as negative_reviews,
+            CAST(NULL AS FLOAT64) as revenue,
+            CAST(NULL AS FLOAT64) as avg_value
+        FROM reviews
         GROUP BY year_month
-        ORDER BY year_month
-        """
-        
-        monthly_result = client.query(monthly_query).result()
-        monthly_data = pl.from_pandas(monthly_result.to_dataframe())
-        
-        # Category review performance
-        category_query = """
+    ),
+    category AS (
         SELECT 
-            product_category_english as product_category_name,
-            CAST(COUNT(*) AS INT64) as review_count,
+            ROW_NUMBER() OVER (ORDER BY COUNT(*) DESC) as sort_rank,
+            product_category_english as label,
+            CAST(COUNT(*) AS INT64) as item_count,
             ROUND(AVG(review_score), 2) as avg_review_score,
-            CAST(COUNT(CASE WHEN review_score >= 4 THEN 1 END) AS INT64) as positive_reviews,
-            CAST(COUNT(CASE WHEN review_score <= 2 THEN 1 END) AS INT64) as negative_reviews,
-            ROUND(AVG(allocated_payment), 2) as avg_order_value
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
-        WHERE review_score IS NOT NULL AND product_category_english IS NOT NULL
+            CAST(COUNTIF(review_score >= 4) AS INT64) as positive_reviews,
+            CAST(COUNTIF(review_score <= 2) AS INT64) as negative_reviews,
+            CAST(NULL AS FLOAT64) as revenue,
+            ROUND(AVG(allocated_payment), 2) as avg_value
+        FROM reviews
+        WHERE product_category_english IS NOT NULL
         GROUP BY product_category_english
-        ORDER BY review_count DESC
-        LIMIT 20
-        """
-        
-        category_result = client.query(category_query).result()
-        category_data = pl.from_pandas(category_result.to_dataframe())
-        
-        # Customer satisfaction analysis
-        satisfaction_query = """
+        QUALIFY sort_rank <= 20
+    ),
+    satisfaction AS (
+        -- Customer satisfaction tiers cover every order with a tier, reviewed or not
         SELECT 
-            satisfaction_level as satisfaction_tier,
-            CAST(COUNT(DISTINCT customer_id) AS INT64) as customer_count,
+            ROW_NUMBER() OVER (ORDER BY AVG(review_score) DESC) as sort_rank,
+            satisfaction_level as label,
+            CAST(COUNT(DISTINCT customer_id) AS INT64) as item_count,
             ROUND(AVG(review_score), 2) as avg_review_score,
-            ROUND(SUM(allocated_payment), 2) as total_revenue,
-            ROUND(AVG(allocated_payment), 2) as avg_customer_value
-        FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
+            CAST(NULL AS INT64) as positive_reviews,
+            CAST(NULL AS INT64) as negative_reviews,
+            ROUND(SUM(allocated_payment), 2) as revenue,
+            ROUND(AVG(allocated_payment), 2) as avg_value
+        FROM base
         WHERE satisfaction_level IS NOT NULL
         GROUP BY satisfaction_level
-        ORDER BY avg_review_score DESC
-        """
-        
-        satisfaction_result = client.query(satisfaction_query).result()
-        satisfaction_data = pl.from_pandas(satisfaction_result.to_dataframe())
-        
-        return {
-            'review_data': review_data,
-            'monthly_data': monthly_data,
-            'category_data': category_data,
-            'satisfaction_data': satisfaction_data
-        }
-        
-    except Exception as e:
-        st.error(f"Error loading review analytics: {str(e)}")
-        return None
+    )
+    SELECT 'totals' as result_type, * FROM totals
+    UNION ALL SELECT 'score_distribution' as result_type, * FROM score_distribution
+    UNION ALL SELECT 'score_categories' as result_type, * FROM score_categories
+    UNION ALL SELECT 'state' as result_type, * FROM state
+    UNION ALL SELECT 'monthly' as result_type, * FROM monthly
+    UNION ALL SELECT 'category' as result_type, * FROM category
+    UNION ALL SELECT 'satisfaction' as result_type, * FROM satisfaction
+    ORDER BY result_type, sort_rank
+    """
+    
+    # The summary is persisted to Parquet so restarts within the TTL skip BigQuery
+    result_sets = split_result_sets(
+        cached_query_to_polars(client, summary_query, 'review_analytics', max_age_seconds=1800)
+    )
+    
+    return {
+        'review_totals': select_result_set(result_sets, 'totals', [
+            pl.col("item_count").alias("total_reviews"),
+            pl.col("avg_review_score").alias("avg_rating"),
+            pl.col("positive_reviews"),
+            pl.col("negative_reviews")
+        ]),
+        'score_distribution': select_result_set(result_sets, 'score_distribution', [
+            pl.col("sort_rank").alias("review_score"),
+            pl.col("item_count").alias("count")
+        ]),
+        'score_categories': select_result_set(result_sets, 'score_categories', [
+            pl.col("label").alias("score_category"),
+            pl.col("item_count").alias("count")
+        ]),
+        'state_reviews': select_result_set(result_sets, 'state', [
+            pl.col("label").alias("customer_state"),
+            pl.col("item_count").alias("review_count"),
+            pl.col("avg_review_score").alias("avg_rating"),
+            pl.col("revenue").alias("total_revenue")
+        ]),
+        'monthly_data': select_result_set(result_sets, 'monthly', [
+            pl.col("label").alias("year_month"),
+            pl.col("item_count").alias("review_count"),
+            pl.col("avg_review_score"),
+            pl.col("positive_reviews"),
+            pl.col("negative_reviews")
+        ]),
+        'category_data': select_result_set(result_sets, 'category', [
+            pl.col("label").alias("product_category_name"),
+            pl.col("item_count").alias("review_count"),
+            pl.col("avg_review_score"),
+            pl.col("positive_reviews"),
+            pl.col("negative_reviews"),
+            pl.col("avg_value").alias("avg_order_value")
+        ]),
+        'satisfaction_data': select_result_set(result_sets, 'satisfaction', [
+            pl.col("label").alias("satisfaction_tier"),
+            pl.col("item_count").alias("customer_count"),
+            pl.col("avg_review_score"),
+            pl.col("revenue").alias("total_revenue"),
+            pl.col("avg_value").alias("avg_customer_value")
+        ])
+    }
 
+METRIC_CARD_COLORS = {
+    "primary": {
+        "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
+        "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
+    },
+    "success": {
+        "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
+        "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
+    },
+    "warning": {
+        "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
+        "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
+    },
+    "info": {
+        "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
+        "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
+    }
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_metric_card(title, value, icon, color="primary", subtitle=""):
     """Create a metric card with enhanced styling"""
-    color_schemes = {
-        "primary": {
-            "bg": "linear-gradient(135deg, #667eea 0%, #764ba2 100%)",
-            "shadow": "0 8px 25px rgba(102, 126, 234, 0.3)"
-        },
-        "success": {
-            "bg": "linear-gradient(135deg, #56ab2f 0%, #a8e6cf 100%)",
-            "shadow": "0 8px 25px rgba(86, 171, 47, 0.3)"
-        },
-        "warning": {
-            "bg": "linear-gradient(135deg, #f093fb 0%, #f5576c 100%)",
-            "shadow": "0 8px 25px rgba(240, 147, 251, 0.3)"
-        },
-        "info": {
-            "bg": "linear-gradient(135deg, #4facfe 0%, #00f2fe 100%)",
-            "shadow": "0 8px 25px rgba(79, 172, 254, 0.3)"
-        }
-    }
-    
-    selected_color = color_schemes.get(color, color_schemes["primary"])
+    # Memoized per card arguments so reruns reuse the rendered HTML
+    selected_color = METRIC_CARD_COLORS.get(color, METRIC_CARD_COLORS["primary"])
     
     return f"""
     <div style="
@@ -170,13 +262,14 @@ def main():
     
     # Load data
     with st.spinner("Loading review analytics..."):
-        data = get_review_analytics_data()
-    
-    if not data:
-        st.error("Unable to load review analytics data.")
-        return
+        # Load failures raise instead of being cached, so the next rerun retries the queries
+        try:
+            data = get_review_analytics_data()
+        except Exception as e:
+            st.error(f"Error loading review analytics: {str(e)}")
+            return
     
-    review_data = data['review_data']
+    review_totals = data['review_totals']
     monthly_data = data['monthly_data']
     category_data = data['category_data']
     satisfaction_data = data['satisfaction_data']
@@ -185,12 +278,15 @@ def main():
     st.header("📊 Review Performance Overview")
     st.markdown("### Core Review Metrics")
     
-    if not review_data.is_empty():
-        total_reviews = review_data.height
-        avg_rating = safe_aggregate(review_data, pl.mean("review_score"))
-        positive_reviews = review_data.filter(pl.col("review_score") >= 4).height
-        negative_reviews = review_data.filter(pl.col("review_score") <= 2).height
-        
+    # Review totals arrive pre-aggregated as a single row
+    has_reviews = not review_totals.is_empty()
+    review_metrics = review_totals.row(0, named=True) if has_reviews else {}
+    total_reviews = review_metrics.get('total_reviews') or 0
+    avg_rating = review_metrics.get('avg_rating') or 0
+    positive_reviews = review_metrics.get('positive_reviews') or 0
+    negative_reviews = review_metrics.get('negative_reviews') or 0
+    
+    if has_reviews:
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -234,18 +330,13 @@ def main():
     # Review Score Distribution
     st.header("📈 Review Score Distribution")
     
-    if not review_data.is_empty():
+    if has_reviews:
         col1, col2 = st.columns(2)
         
         with col1:
             # Review score distribution
-            score_distribution = review_data.group_by("review_score").agg([
-                pl.count("order_id").alias("count")
-            ]).sort("review_score")
-            
-            score_pd = score_distribution.to_pandas()
             fig_distribution = px.bar(
-                score_pd,
+                data['score_distribution'],
                 x='review_score',
                 y='count',
                 title='Review Score Distribution',
@@ -257,17 +348,8 @@ def main():
         
         with col2:
             # Review score pie chart
-            score_categories = review_data.with_columns([
-                pl.when(pl.col("review_score") >= 4).then(pl.lit("Positive (4-5)"))
-                .when(pl.col("review_score") == 3).then(pl.lit("Neutral (3)"))
-                .otherwise(pl.lit("Negative (1-2)")).alias("score_category")
-            ]).group_by("score_category").agg([
-                pl.count("order_id").alias("count")
-            ])
-            
-            categories_pd = score_categories.to_pandas()
             fig_pie = px.pie(
-                categories_pd,
+                data['score_categories'],
                 values='count',
                 names='score_category',
                 title='Review Sentiment Distribution',
@@ -284,9 +366,8 @@ def main():
         
         with col1:
             # Average rating trend
-            monthly_pd = monthly_data.to_pandas()
             fig_rating_trend = px.line(
-                monthly_pd,
+                monthly_data,
                 x='year_month',
                 y='avg_review_score',
                 title='Average Review Score Trend',
@@ -298,7 +379,7 @@ def main():
         with col2:
             # Review volume trend
             fig_volume_trend = px.line(
-                monthly_pd,
+                monthly_data,
                 x='year_month',
                 y='review_count',
                 title='Review Volume Trend',
@@ -316,10 +397,9 @@ def main():
         with col1:
             # Top categories by review score
             top_categories = category_data.head(10)
-            categories_pd = top_categories.to_pandas()
             
             fig_cat_scores = px.bar(
-                categories_pd,
+                top_categories,
                 x='avg_review_score',
                 y='product_category_name',
                 orientation='h',
@@ -333,7 +413,7 @@ def main():
         with col2:
             # Review volume by category
             fig_cat_volume = px.bar(
-                categories_pd,
+                top_categories,
                 x='review_count',
                 y='product_category_name',
                 orientation='h',
@@ -351,13 +431,17 @@ def main():
         category_display = category_data.head(15).select([
             pl.col("product_category_name").alias("Category"),
             pl.col("review_count").alias("Reviews"),
-            pl.col("avg_review_score").map_elements(lambda x: f"{x:.2f}⭐", return_dtype=pl.String).alias("Avg Rating"),
+            pl.col("avg_review_score").alias("Avg Rating"),
             pl.col("positive_reviews").alias("Positive"),
             pl.col("negative_reviews").alias("Negative"),
-            pl.col("avg_order_value").map_elements(lambda x: f"${x:.2f}", return_dtype=pl.String).alias("Avg Order Value")
+            pl.col("avg_order_value").alias("Avg Order Value")
         ])
         
-        st.dataframe(category_display, width="stretch")
+        # Columns stay numeric so they sort correctly; Streamlit formats them for display
+        st.dataframe(category_display, width="stretch", column_config={
+            "Avg Rating": st.column_config.NumberColumn(format="%.2f⭐"),
+            "Avg Order Value": st.column_config.NumberColumn(format="$%.2f")
+        })
     
     # Customer Satisfaction Analysis
     st.header("😊 Customer Satisfaction Tiers")
@@ -367,9 +451,8 @@ def main():
         
         with col1:
             # Satisfaction tier distribution
-            satisfaction_pd = satisfaction_data.to_pandas()
             fig_satisfaction = px.pie(
-                satisfaction_pd,
+                satisfaction_data,
                 values='customer_count',
                 names='satisfaction_tier',
                 title='Customer Distribution by Satisfaction Tier',
@@ -381,7 +464,7 @@ def main():
         with col2:
             # Revenue by satisfaction tier
             fig_satisfaction_revenue = px.bar(
-                satisfaction_pd,
+                satisfaction_data,
                 x='satisfaction_tier',
                 y='total_revenue',
                 title='Revenue by Satisfaction Tier',
@@ -394,21 +477,15 @@ def main():
     # Geographic Review Analysis
     st.header("🗺️ Geographic Review Patterns")
     
-    if not review_data.is_empty():
-        # State-wise review analysis
-        state_reviews = review_data.group_by("customer_state").agg([
-            pl.count("order_id").alias("review_count"),
-            pl.mean("review_score").alias("avg_rating"),
-            pl.sum("payment_value").alias("total_revenue")
-        ]).sort("review_count", descending=True).head(15)
+    if has_reviews:
+        state_reviews = data['state_reviews']
         
         col1, col2 = st.columns(2)
         
         with col1:
             # Top states by review count
-            state_pd = state_reviews.to_pandas()
             fig_state_reviews = px.bar(
-                state_pd,
+                state_reviews,
                 x='customer_state',
                 y='review_count',
                 title='Review Count by State (Top 15)',
@@ -421,7 +498,7 @@ def main():
         with col2:
             # Average rating by state
             fig_state_rating = px.bar(
-                state_pd,
+                state_reviews,
                 x='customer_state',
                 y='avg_rating',
                 title='Average Rating by State',
@@ -436,9 +513,11 @@ def main():
         st.header("📋 Key Review Insights")
         
         # Calculate insights
-        top_category = safe_item(category_data.head(1).select("product_category_name"), "N/A")
-        high_satisfaction_filter = satisfaction_data.filter(pl.col("satisfaction_tier").str.contains("High")) if not satisfaction_data.is_empty() else pl.DataFrame()
-        high_satisfaction = safe_aggregate(high_satisfaction_filter, pl.col("customer_count").sum())
+        top_category = category_data["product_category_name"][0] or "N/A"
+        high_satisfaction = safe_aggregate(
+            satisfaction_data,
+            pl.col("customer_count").filter(pl.col("satisfaction_tier").str.contains("High")).sum()
+        )
         
         col1, col2, col3, col4 = st.columns(4)
         
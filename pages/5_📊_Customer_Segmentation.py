@@ -1,15 +1,17 @@
 import streamlit as st
-import pandas as pd
+import polars as pl
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import json
+import math
 import sys
 import os
 
 # Add utils to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'utils'))
-from database import get_bigquery_client
+from database import get_bigquery_client, query_to_polars
+from performance import optimize_dataframe_memory
 
 st.set_page_config(
     page_title="Customer Segmentation Dashboard",
@@ -38,7 +40,7 @@ st.markdown("""
 
 def format_currency(value):
     """Format currency values consistently"""
-    if pd.isna(value) or value == 0:
+    if value is None or math.isnan(value) or value == 0:
         return "$0"
     elif value >= 1_000_000:
         return f"${value/1_000_000:.1f}M"
@@ -49,7 +51,7 @@ def format_currency(value):
 
 def format_number(value):
     """Format large numbers consistently"""
-    if pd.isna(value) or value == 0:
+    if value is None or math.isnan(value) or value == 0:
         return "0"
     elif value >= 1_000_000:
         return f"{value/1_000_000:.1f}M"
@@ -60,66 +62,70 @@ def format_number(value):
 
 def format_percentage(value):
     """Format percentage values consistently"""
-    if pd.isna(value):
+    if value is None or math.isnan(value):
         return "0.0%"
     return f"{value:.1f}%"
 
 def format_rating(value):
     """Format rating values consistently"""
-    if pd.isna(value):
+    if value is None or math.isnan(value):
         return "0.0/5"
     return f"{value:.2f}/5"
 
-@st.cache_data
+# Columns of the segment, geographic and behavior views (and their CSV exports)
+SEGMENT_COLUMNS = [
+    'customer_segment', 'customer_id', 'customer_state', 'total_spent', 'total_orders',
+    'avg_order_value', 'avg_review_score', 'predicted_annual_clv', 'first_order_date', 'last_order_date'
+]
+GEO_COLUMNS = [
+    'customer_state', 'customer_city', 'customer_id', 'total_spent', 'total_orders',
+    'avg_order_value', 'avg_review_score', 'customer_segment'
+]
+BEHAVIOR_COLUMNS = [
+    'customer_id', 'customer_segment', 'customer_state', 'total_orders', 'total_spent',
+    'avg_order_value', 'avg_review_score', 'purchase_behavior'
+]
+
+# Box and outlier points share Plotly's default first trace colour
+BOX_COLOR = '#636efa'
+
+# Per-segment cap on points drawn in the segment comparison scatter
+SCATTER_POINTS_PER_SEGMENT = 1000
+
+# Summary tables stay numeric (and sortable); Streamlit applies these formats in the browser
+SUMMARY_COLUMN_CONFIG = {
+    'Customer Count': st.column_config.NumberColumn(format="%d"),
+    'Avg Spent': st.column_config.NumberColumn(format="$%.2f"),
+    'Total Revenue': st.column_config.NumberColumn(format="$%.0f"),
+    'Avg Order Value': st.column_config.NumberColumn(format="$%.2f"),
+    'Avg Orders': st.column_config.NumberColumn(format="%.1f"),
+    'Avg Rating': st.column_config.NumberColumn(format="%.2f/5"),
+    '% of Base': st.column_config.NumberColumn(format="%.1f%%")
+}
+
+# cache_resource returns the cached customer frames by reference; every filter builds new frames
+@st.cache_resource(ttl=1800)
 def load_customer_data():
     """Load customer analytics data from BigQuery"""
     client = get_bigquery_client()
     if not client:
-        st.error("Could not connect to BigQuery")
-        return None, None, None, None
+        raise RuntimeError("Could not connect to BigQuery")
     
-    # Customer segments data
-    segments_query = """
+    # The segment, geographic and behavior views all read the same customers, so they
+    # come from one query and one download instead of three
+    customers_query = """
     SELECT 
-        customer_segment,
         customer_id,
+        customer_segment,
         customer_state,
+        customer_city,
         total_spent,
         total_orders,
         avg_order_value,
         avg_review_score,
         predicted_annual_clv,
         first_order_date,
-        last_order_date
-    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-    WHERE total_orders > 0 AND customer_segment IS NOT NULL
-    """
-    
-    # Geographic data
-    geo_query = """
-    SELECT 
-        customer_state,
-        customer_city,
-        customer_id,
-        total_spent,
-        total_orders,
-        avg_order_value,
-        avg_review_score,
-        customer_segment
-    FROM `project-olist-470307.dbt_olist_analytics.customer_analytics_obt`
-    WHERE total_orders > 0
-    """
-    
-    # Purchase behavior data
-    behavior_query = """
-    SELECT 
-        customer_id,
-        customer_segment,
-        customer_state,
-        total_orders,
-        total_spent,
-        avg_order_value,
-        avg_review_score,
+        last_order_date,
         CASE 
             WHEN total_orders = 1 THEN 'One-time Buyers'
             WHEN total_orders BETWEEN 2 AND 3 THEN 'Occasional Buyers'
@@ -130,39 +136,61 @@ def load_customer_data():
     WHERE total_orders > 0
     """
     
+    # Customer-level rows are held for the whole session, so integer counts are narrowed
+    # and the 1-5 review average is stored as Float32; spend columns stay Float64 for totals
+    customers_df = optimize_dataframe_memory(
+        query_to_polars(client, customers_query),
+        float32_columns=['avg_review_score']
+    )
+    
+    # Load additional data from JSON if available
+    overview_data = None
     try:
-        segments_df = client.query(segments_query).result().to_dataframe()
-        geo_df = client.query(geo_query).result().to_dataframe()
-        behavior_df = client.query(behavior_query).result().to_dataframe()
+        with open('/Users/jefflee/SCTP/M2Project/M2Project-MarketingVisualisation/customer_analytics_snapshot.json', 'r') as f:
+            data = json.load(f)
+            overview_data = data.get('overview', {})
+    except:
+        pass
         
-        # Load additional data from JSON if available
-        overview_data = None
-        try:
-            with open('/Users/jefflee/SCTP/M2Project/M2Project-MarketingVisualisation/customer_analytics_snapshot.json', 'r') as f:
-                data = json.load(f)
-                overview_data = data.get('overview', {})
-        except:
-            pass
-            
-        return segments_df, geo_df, behavior_df, overview_data
-    except Exception as e:
-        st.error(f"Error loading data: {e}")
-        return None, None, None, None
+    # Sidebar options and slider bounds only change with the data, so they are computed here once
+    filter_options = {
+        'segments': customers_df['customer_segment'].drop_nulls().unique().sort().to_list(),
+        'states': customers_df['customer_state'].drop_nulls().unique().sort().to_list(),
+        'behaviors': customers_df['purchase_behavior'].unique().sort().to_list(),
+        **customers_df.filter(pl.col('customer_segment').is_not_null()).select([
+            pl.col('total_spent').min().alias('min_spent'),
+            pl.col('total_spent').max().alias('max_spent'),
+            pl.col('total_orders').min().alias('min_orders'),
+            pl.col('total_orders').max().alias('max_orders')
+        ]).row(0, named=True)
+    }
+        
+    return customers_df, overview_data, filter_options
+
+def summarize_segments(filtered_data):
+    """Aggregate per-segment metrics once for both the overview chart and the details table"""
+    return filtered_data.group_by('customer_segment').agg([
+        pl.col('customer_id').count().alias('Customer Count'),
+        pl.col('total_spent').mean().alias('Avg Spent'),
+        pl.col('total_spent').sum().alias('Total Revenue'),
+        pl.col('total_orders').mean().alias('Avg Orders'),
+        pl.col('avg_order_value').mean().alias('Avg Order Value'),
+        pl.col('avg_review_score').mean().alias('Avg Rating')
+    ]).with_columns(pl.col(pl.Float32, pl.Float64).round(2)).sort('customer_segment')
+
+def summarize_behavior(filtered_data):
+    """Aggregate per-behavior metrics once for both the donut chart and the summary table"""
+    return filtered_data.group_by('purchase_behavior').agg([
+        pl.col('customer_id').count().alias('Customer Count'),
+        pl.col('total_spent').mean().alias('Avg Spent'),
+        pl.col('avg_order_value').mean().alias('Avg Order Value'),
+        pl.col('avg_review_score').mean().alias('Avg Rating')
+    ]).with_columns(pl.col(pl.Float32, pl.Float64).round(2)).sort('purchase_behavior')
 
-def create_segment_summary_chart(filtered_data):
+def create_segment_summary_chart(segment_summary):
     """Create segment summary visualization"""
-    if filtered_data.empty:
+    if segment_summary.is_empty():
         return None
-        
-    segment_summary = filtered_data.groupby('customer_segment').agg({
-        'customer_id': 'count',
-        'total_spent': 'mean',
-        'avg_order_value': 'mean',
-        'avg_review_score': 'mean'
-    }).round(2)
-    
-    segment_summary.columns = ['Customer Count', 'Avg Spent', 'Avg Order Value', 'Avg Rating']
-    segment_summary = segment_summary.reset_index()
     
     # Create subplot with better formatting
     fig = make_subplots(
@@ -174,11 +202,11 @@ def create_segment_summary_chart(filtered_data):
     # Customer count bar chart
     fig.add_trace(
         go.Bar(
-            x=segment_summary['customer_segment'],
-            y=segment_summary['Customer Count'],
+            x=segment_summary['customer_segment'].to_list(),
+            y=segment_summary['Customer Count'].to_list(),
             name='Customer Count',
             marker_color='#1f77b4',
-            text=[format_number(x) for x in segment_summary['Customer Count']],
+            texttemplate='%{y:,.0f}',
             textposition='auto'
         ),
         row=1, col=1
@@ -187,11 +215,11 @@ def create_segment_summary_chart(filtered_data):
     # Average spent bar chart
     fig.add_trace(
         go.Bar(
-            x=segment_summary['customer_segment'],
-            y=segment_summary['Avg Spent'],
+            x=segment_summary['customer_segment'].to_list(),
+            y=segment_summary['Avg Spent'].to_list(),
             name='Avg Spent ($)',
             marker_color='#ff7f0e',
-            text=[format_currency(x) for x in segment_summary['Avg Spent']],
+            texttemplate='$%{y:,.0f}',
             textposition='auto'
         ),
         row=1, col=2
@@ -212,21 +240,18 @@ def create_segment_summary_chart(filtered_data):
 
 def create_geographic_map(filtered_data):
     """Create geographic distribution map"""
-    if filtered_data.empty:
+    if filtered_data.is_empty():
         return None
         
-    state_summary = filtered_data.groupby('customer_state').agg({
-        'customer_id': 'count',
-        'total_spent': 'sum',
-        'avg_order_value': 'mean'
-    }).round(2)
-    
-    state_summary.columns = ['Customer Count', 'Total Revenue', 'Avg Order Value']
-    state_summary = state_summary.reset_index().sort_values('Total Revenue', ascending=False)
+    state_summary = filtered_data.group_by('customer_state').agg([
+        pl.col('customer_id').count().alias('Customer Count'),
+        pl.col('total_spent').sum().alias('Total Revenue'),
+        pl.col('avg_order_value').mean().alias('Avg Order Value')
+    ]).with_columns(pl.col(pl.Float32, pl.Float64).round(2))
     
     # Create enhanced bar chart
     fig = px.bar(
-        state_summary.head(10),
+        state_summary.top_k(10, by='Total Revenue').sort('Total Revenue', descending=True),
         x='customer_state',
         y='Total Revenue',
         color='Customer Count',
@@ -258,19 +283,10 @@ def create_geographic_map(filtered_data):
     
     return fig
 
-def create_behavior_analysis_chart(filtered_data):
+def create_behavior_analysis_chart(behavior_summary):
     """Create purchase behavior analysis chart"""
-    if filtered_data.empty:
+    if behavior_summary.is_empty():
         return None
-        
-    behavior_summary = filtered_data.groupby('purchase_behavior').agg({
-        'customer_id': 'count',
-        'total_spent': 'mean',
-        'avg_review_score': 'mean'
-    }).round(2)
-    
-    behavior_summary.columns = ['Customer Count', 'Avg Spent', 'Avg Rating']
-    behavior_summary = behavior_summary.reset_index()
     
     # Create enhanced donut chart
     fig = px.pie(
@@ -297,38 +313,113 @@ def create_behavior_analysis_chart(filtered_data):
     
     return fig
 
-def create_segment_metrics_table(filtered_data):
+def create_spending_box_chart(filtered_data):
+    """Spending box plot from precomputed quartiles, so only the box statistics and outliers reach the browser"""
+    spent = pl.col('total_spent')
+    # Linear interpolation matches Plotly's default quartile method
+    q1 = spent.quantile(0.25, interpolation='linear')
+    q3 = spent.quantile(0.75, interpolation='linear')
+    iqr = q3 - q1
+    # Whiskers end at the furthest points within 1.5 IQR, matching Plotly's own box computation
+    in_fences = spent.is_between(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+    within = spent.filter(in_fences)
+    
+    box_stats = filtered_data.group_by('purchase_behavior').agg([
+        q1.alias('q1'),
+        spent.median().alias('median'),
+        q3.alias('q3'),
+        within.min().alias('lowerfence'),
+        within.max().alias('upperfence'),
+        spent.filter(~in_fences).alias('outliers')
+    ]).sort('purchase_behavior')
+    # Points outside the fences are drawn individually, as px.box does
+    outliers = box_stats.select(['purchase_behavior', 'outliers']).explode('outliers').drop_nulls('outliers')
+    
+    fig = go.Figure(go.Box(
+        x=box_stats['purchase_behavior'].to_list(),
+        q1=box_stats['q1'].to_list(),
+        median=box_stats['median'].to_list(),
+        q3=box_stats['q3'].to_list(),
+        lowerfence=box_stats['lowerfence'].to_list(),
+        upperfence=box_stats['upperfence'].to_list(),
+        name='Total Spent ($)',
+        marker_color=BOX_COLOR
+    ))
+    fig.add_trace(go.Scatter(
+        x=outliers['purchase_behavior'].to_list(),
+        y=outliers['outliers'].to_numpy(),
+        mode='markers',
+        name='Outliers',
+        marker_color=BOX_COLOR,
+        showlegend=False
+    ))
+    fig.update_layout(
+        title='Spending Distribution by Purchase Behavior',
+        template="plotly_white"
+    )
+    return fig
+
+def create_segment_metrics_table(segment_summary):
     """Create detailed segment metrics table"""
-    if filtered_data.empty:
-        return pd.DataFrame()
-        
-    segment_details = filtered_data.groupby('customer_segment').agg({
-        'customer_id': 'count',
-        'total_spent': ['mean', 'sum'],
-        'total_orders': 'mean',
-        'avg_order_value': 'mean',
-        'avg_review_score': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    segment_details.columns = ['Customer Count', 'Avg Spent', 'Total Revenue', 'Avg Orders', 'Avg Order Value', 'Avg Rating']
-    segment_details = segment_details.reset_index()
+    if segment_summary.is_empty():
+        return pl.DataFrame()
     
     # Calculate percentage of base
-    total_customers = segment_details['Customer Count'].sum()
-    segment_details['% of Base'] = (segment_details['Customer Count'] / total_customers * 100).round(1)
-    
-    # Format currency and numeric columns for display
-    segment_details_display = segment_details.copy()
-    segment_details_display['Avg Spent'] = segment_details_display['Avg Spent'].apply(format_currency)
-    segment_details_display['Total Revenue'] = segment_details_display['Total Revenue'].apply(format_currency)
-    segment_details_display['Avg Order Value'] = segment_details_display['Avg Order Value'].apply(format_currency)
-    segment_details_display['Customer Count'] = segment_details_display['Customer Count'].apply(format_number)
-    segment_details_display['Avg Orders'] = segment_details_display['Avg Orders'].apply(lambda x: f"{x:.1f}")
-    segment_details_display['Avg Rating'] = segment_details_display['Avg Rating'].apply(lambda x: f"{x:.2f}/5")
-    segment_details_display['% of Base'] = segment_details_display['% of Base'].apply(lambda x: f"{x:.1f}%")
-    
-    return segment_details_display
+    return segment_summary.with_columns(
+        (pl.col('Customer Count') / pl.col('Customer Count').sum() * 100).round(1).alias('% of Base')
+    )
+
+@st.fragment
+def render_data_export(filtered_segments, filtered_geo, filtered_behavior):
+    """Raw data export tab - a fragment so its widgets rerun only this section"""
+    st.subheader("📋 Raw Data Export")
+    
+    # Data export options
+    col1, col2 = st.columns(2)
+    with col1:
+        data_view = st.selectbox(
+            "Select Data View",
+            ["Segmentation Data", "Geographic Data", "Behavior Data"]
+        )
+    with col2:
+        max_rows = st.number_input("Max Rows to Display", min_value=10, max_value=1000, value=100)
+    
+    if data_view == "Segmentation Data":
+        if not filtered_segments.is_empty():
+            st.dataframe(filtered_segments.head(max_rows), use_container_width=True)
+            st.download_button(
+                "📥 Download Segmentation Data",
+                filtered_segments.write_csv(),
+                "segmentation_data.csv",
+                "text/csv",
+                help="Download the filtered segmentation data as CSV"
+            )
+        else:
+            st.warning("⚠️ No segmentation data available for the selected filters.")
+    elif data_view == "Geographic Data":
+        if not filtered_geo.is_empty():
+            st.dataframe(filtered_geo.head(max_rows), use_container_width=True)
+            st.download_button(
+                "📥 Download Geographic Data",
+                filtered_geo.write_csv(),
+                "geographic_data.csv",
+                "text/csv",
+                help="Download the filtered geographic data as CSV"
+            )
+        else:
+            st.warning("⚠️ No geographic data available for the selected filters.")
+    else:
+        if not filtered_behavior.is_empty():
+            st.dataframe(filtered_behavior.head(max_rows), use_container_width=True)
+            st.download_button(
+                "📥 Download Behavior Data",
+                filtered_behavior.write_csv(),
+                "behavior_data.csv",
+                "text/csv",
+                help="Download the filtered behavior data as CSV"
+            )
+        else:
+            st.warning("⚠️ No behavior data available for the selected filters.")
 
 # Main app
 def main():
@@ -336,81 +427,80 @@ def main():
     st.markdown("Interactive visualization dashboard for customer analytics and marketing insights")
     
     # Load data
-    segments_df, geo_df, behavior_df, overview_data = load_customer_data()
-    
-    if segments_df is None:
-        st.error("Unable to load data. Please check your connection.")
+    # Load failures raise instead of being cached, so the next rerun retries the query
+    try:
+        customers_df, overview_data, filter_options = load_customer_data()
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
         return
     
     # Sidebar filters
     st.sidebar.header("🎛️ Filters")
     
-    # Segment filter
-    available_segments = sorted(segments_df['customer_segment'].unique())
-    selected_segments = st.sidebar.multiselect(
-        "Customer Segments",
-        available_segments,
-        default=available_segments
-    )
-    
-    # State filter
-    available_states = sorted(geo_df['customer_state'].unique())
-    selected_states = st.sidebar.multiselect(
-        "States",
-        available_states,
-        default=available_states[:10]  # Default to top 10
-    )
-    
-    # Purchase behavior filter
-    available_behaviors = sorted(behavior_df['purchase_behavior'].unique())
-    selected_behaviors = st.sidebar.multiselect(
-        "Purchase Behavior",
-        available_behaviors,
-        default=available_behaviors
-    )
-    
-    # Spending range filter
-    min_spent = float(segments_df['total_spent'].min())
-    max_spent = float(segments_df['total_spent'].max())
-    spending_range = st.sidebar.slider(
-        "Total Spent Range ($)",
-        min_value=min_spent,
-        max_value=max_spent,
-        value=(min_spent, max_spent)
-    )
-    
-    # Orders range filter
-    min_orders = int(segments_df['total_orders'].min())
-    max_orders = int(segments_df['total_orders'].max())
-    orders_range = st.sidebar.slider(
-        "Total Orders Range",
-        min_value=min_orders,
-        max_value=max_orders,
-        value=(min_orders, max_orders)
+    # Filters are applied together on submit instead of rerunning the page per widget change
+    with st.sidebar.form("filters"):
+        # Segment filter
+        available_segments = filter_options['segments']
+        selected_segments = st.multiselect(
+            "Customer Segments",
+            available_segments,
+            default=available_segments
+        )
+        
+        # State filter
+        available_states = filter_options['states']
+        selected_states = st.multiselect(
+            "States",
+            available_states,
+            default=available_states[:10]  # Default to top 10
+        )
+        
+        # Purchase behavior filter
+        available_behaviors = filter_options['behaviors']
+        selected_behaviors = st.multiselect(
+            "Purchase Behavior",
+            available_behaviors,
+            default=available_behaviors
+        )
+        
+        # Spending range filter
+        min_spent = float(filter_options['min_spent'])
+        max_spent = float(filter_options['max_spent'])
+        spending_range = st.slider(
+            "Total Spent Range ($)",
+            min_value=min_spent,
+            max_value=max_spent,
+            value=(min_spent, max_spent)
+        )
+        
+        # Orders range filter
+        min_orders = int(filter_options['min_orders'])
+        max_orders = int(filter_options['max_orders'])
+        orders_range = st.slider(
+            "Total Orders Range",
+            min_value=min_orders,
+            max_value=max_orders,
+            value=(min_orders, max_orders)
+        )
+        
+        st.form_submit_button("Apply Filters")
+    
+    # Apply filters; the shared predicate is built once and reused by all three views
+    customer_filter = (
+        pl.col('customer_segment').is_in(selected_segments) &
+        pl.col('customer_state').is_in(selected_states) &
+        pl.col('total_spent').is_between(spending_range[0], spending_range[1]) &
+        pl.col('total_orders').is_between(orders_range[0], orders_range[1])
     )
     
-    # Apply filters
-    filtered_segments = segments_df[
-        (segments_df['customer_segment'].isin(selected_segments)) &
-        (segments_df['customer_state'].isin(selected_states)) &
-        (segments_df['total_spent'].between(spending_range[0], spending_range[1])) &
-        (segments_df['total_orders'].between(orders_range[0], orders_range[1]))
-    ]
-    
-    filtered_geo = geo_df[
-        (geo_df['customer_segment'].isin(selected_segments)) &
-        (geo_df['customer_state'].isin(selected_states)) &
-        (geo_df['total_spent'].between(spending_range[0], spending_range[1])) &
-        (geo_df['total_orders'].between(orders_range[0], orders_range[1]))
-    ]
-    
-    filtered_behavior = behavior_df[
-        (behavior_df['customer_segment'].isin(selected_segments)) &
-        (behavior_df['customer_state'].isin(selected_states)) &
-        (behavior_df['purchase_behavior'].isin(selected_behaviors)) &
-        (behavior_df['total_spent'].between(spending_range[0], spending_range[1])) &
-        (behavior_df['total_orders'].between(orders_range[0], orders_range[1]))
-    ]
+    # All three views are projections of one lazily filtered frame; collect_all evaluates
+    # the shared filter once and materializes only the columns each view needs
+    filtered_customers = customers_df.lazy().filter(customer_filter)
+    filtered_segments, filtered_geo, filtered_behavior = pl.collect_all([
+        filtered_customers.select(SEGMENT_COLUMNS),
+        filtered_customers.select(GEO_COLUMNS),
+        filtered_customers.filter(pl.col('purchase_behavior').is_in(selected_behaviors)).select(BEHAVIOR_COLUMNS)
+    ])
     
     # Overview metrics
     if overview_data:
@@ -443,30 +533,36 @@ def main():
     
     # Filtered metrics
     st.subheader("🎯 Filtered Data Overview")
-    if not filtered_segments.empty:
+    if not filtered_segments.is_empty():
+        # Filtered KPIs are computed together once, before the metric columns render
+        filtered_stats = filtered_segments.select([
+            pl.col('total_spent').sum().alias('revenue'),
+            pl.col('total_spent').mean().alias('avg_value'),
+            pl.col('avg_review_score').mean().alias('avg_rating')
+        ]).row(0, named=True)
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric(
                 "Filtered Customers", 
-                format_number(len(filtered_segments)),
+                format_number(filtered_segments.height),
                 help="Customers matching current filters"
             )
         with col2:
-            filtered_revenue = filtered_segments['total_spent'].sum()
+            filtered_revenue = filtered_stats['revenue']
             st.metric(
                 "Filtered Revenue", 
                 format_currency(filtered_revenue),
                 help="Total revenue from filtered customers"
             )
         with col3:
-            avg_filtered_value = filtered_segments['total_spent'].mean()
+            avg_filtered_value = filtered_stats['avg_value']
             st.metric(
                 "Avg Filtered Value", 
                 format_currency(avg_filtered_value),
                 help="Average value of filtered customers"
             )
         with col4:
-            avg_filtered_rating = filtered_segments['avg_review_score'].mean()
+            avg_filtered_rating = filtered_stats['avg_rating']
             st.metric(
                 "Avg Rating", 
                 format_rating(avg_filtered_rating),
@@ -482,21 +578,28 @@ def main():
         st.subheader("Customer Segmentation Analysis")
         
         # Segment overview chart
-        if not filtered_segments.empty:
-            fig_segments = create_segment_summary_chart(filtered_segments)
+        if not filtered_segments.is_empty():
+            segment_summary = summarize_segments(filtered_segments)
+            fig_segments = create_segment_summary_chart(segment_summary)
             if fig_segments:
                 st.plotly_chart(fig_segments, use_container_width=True)
             
             # Detailed metrics table
             st.subheader("📋 Segment Details")
-            segment_table = create_segment_metrics_table(filtered_segments)
-            if not segment_table.empty:
-                st.dataframe(segment_table, use_container_width=True, hide_index=True)
+            segment_table = create_segment_metrics_table(segment_summary)
+            if not segment_table.is_empty():
+                st.dataframe(segment_table, use_container_width=True, hide_index=True,
+                             column_config=SUMMARY_COLUMN_CONFIG)
             
             # Segment comparison scatter plot
             st.subheader("💎 Segment Performance Comparison")
+            # Up to SCATTER_POINTS_PER_SEGMENT random customers per segment keeps small segments
+            # visible without sending every filtered customer to the browser
+            scatter_sample = filtered_segments.filter(
+                pl.int_range(pl.len()).shuffle(seed=0).over('customer_segment') < SCATTER_POINTS_PER_SEGMENT
+            )
             fig_scatter = px.scatter(
-                filtered_segments,
+                scatter_sample,
                 x='avg_order_value',
                 y='total_spent',
                 color='customer_segment',
@@ -523,7 +626,7 @@ def main():
     with tab2:
         st.subheader("Geographic Distribution Analysis")
         
-        if not filtered_geo.empty:
+        if not filtered_geo.is_empty():
             # Geographic map/chart
             fig_geo = create_geographic_map(filtered_geo)
             if fig_geo:
@@ -531,8 +634,10 @@ def main():
             
             # State-wise segment distribution
             st.subheader("🎯 Segment Distribution by State")
-            state_segment_pivot = filtered_geo.groupby(['customer_state', 'customer_segment']).size().reset_index(name='count')
-            if not state_segment_pivot.empty:
+            state_segment_pivot = filtered_geo.group_by(['customer_state', 'customer_segment']).agg(
+                pl.len().alias('count')
+            ).sort(['customer_state', 'customer_segment'])
+            if not state_segment_pivot.is_empty():
                 fig_state_segment = px.bar(
                     state_segment_pivot,
                     x='customer_state',
@@ -547,41 +652,29 @@ def main():
             
             # Top cities
             st.subheader("🏙️ Top Cities")
-            city_summary = filtered_geo.groupby('customer_city').agg({
-                'customer_id': 'count',
-                'total_spent': 'sum'
-            }).round(2)
-            city_summary.columns = ['Customer Count', 'Total Revenue']
-            city_summary = city_summary.reset_index().sort_values('Total Revenue', ascending=False).head(10)
-            
-            # Format the display data
-            city_summary_display = city_summary.copy()
-            city_summary_display['Customer Count'] = city_summary_display['Customer Count'].apply(format_number)
-            city_summary_display['Total Revenue'] = city_summary_display['Total Revenue'].apply(format_currency)
+            city_summary = filtered_geo.group_by('customer_city').agg([
+                pl.col('customer_id').count().alias('Customer Count'),
+                pl.col('total_spent').sum().round(2).alias('Total Revenue')
+            ]).top_k(10, by='Total Revenue').sort('Total Revenue', descending=True)
             
-            st.dataframe(city_summary_display, use_container_width=True, hide_index=True)
+            st.dataframe(city_summary, use_container_width=True, hide_index=True,
+                         column_config=SUMMARY_COLUMN_CONFIG)
         else:
             st.warning("⚠️ No geographic data available for the selected filters.")
     
     with tab3:
         st.subheader("📊 Purchase Behavior Analysis")
         
-        if not filtered_behavior.empty:
+        if not filtered_behavior.is_empty():
             # Behavior distribution
-            fig_behavior = create_behavior_analysis_chart(filtered_behavior)
+            behavior_summary = summarize_behavior(filtered_behavior)
+            fig_behavior = create_behavior_analysis_chart(behavior_summary)
             if fig_behavior:
                 st.plotly_chart(fig_behavior, use_container_width=True)
             
             # Behavior vs spending
             st.subheader("💰 Spending Patterns by Behavior")
-            fig_behavior_spending = px.box(
-                filtered_behavior,
-                x='purchase_behavior',
-                y='total_spent',
-                title='Spending Distribution by Purchase Behavior',
-                labels={'purchase_behavior': 'Purchase Behavior', 'total_spent': 'Total Spent ($)'},
-                template="plotly_white"
-            )
+            fig_behavior_spending = create_spending_box_chart(filtered_behavior)
             fig_behavior_spending.update_layout(
                 xaxis_title="Purchase Behavior",
                 yaxis_title="Total Spent ($)",
@@ -591,75 +684,13 @@ def main():
             
             # Behavior summary table
             st.subheader("📈 Behavior Summary Metrics")
-            behavior_summary = filtered_behavior.groupby('purchase_behavior').agg({
-                'customer_id': 'count',
-                'total_spent': 'mean',
-                'avg_order_value': 'mean',
-                'avg_review_score': 'mean'
-            }).round(2)
-            behavior_summary.columns = ['Customer Count', 'Avg Spent', 'Avg Order Value', 'Avg Rating']
-            behavior_summary = behavior_summary.reset_index()
-            
-            # Format the display data
-            behavior_summary_display = behavior_summary.copy()
-            behavior_summary_display['Customer Count'] = behavior_summary_display['Customer Count'].apply(format_number)
-            behavior_summary_display['Avg Spent'] = behavior_summary_display['Avg Spent'].apply(format_currency)
-            behavior_summary_display['Avg Order Value'] = behavior_summary_display['Avg Order Value'].apply(format_currency)
-            behavior_summary_display['Avg Rating'] = behavior_summary_display['Avg Rating'].apply(format_rating)
-            
-            st.dataframe(behavior_summary_display, use_container_width=True, hide_index=True)
+            st.dataframe(behavior_summary, use_container_width=True, hide_index=True,
+                         column_config=SUMMARY_COLUMN_CONFIG)
         else:
             st.warning("⚠️ No behavior data available for the selected filters.")
     
     with tab4:
-        st.subheader("📋 Raw Data Export")
-        
-        # Data export options
-        col1, col2 = st.columns(2)
-        with col1:
-            data_view = st.selectbox(
-                "Select Data View",
-                ["Segmentation Data", "Geographic Data", "Behavior Data"]
-            )
-        with col2:
-            max_rows = st.number_input("Max Rows to Display", min_value=10, max_value=1000, value=100)
-        
-        if data_view == "Segmentation Data":
-            if not filtered_segments.empty:
-                st.dataframe(filtered_segments.head(max_rows), use_container_width=True)
-                st.download_button(
-                    "📥 Download Segmentation Data",
-                    filtered_segments.to_csv(index=False),
-                    "segmentation_data.csv",
-                    "text/csv",
-                    help="Download the filtered segmentation data as CSV"
-                )
-            else:
-                st.warning("⚠️ No segmentation data available for the selected filters.")
-        elif data_view == "Geographic Data":
-            if not filtered_geo.empty:
-                st.dataframe(filtered_geo.head(max_rows), use_container_width=True)
-                st.download_button(
-                    "📥 Download Geographic Data",
-                    filtered_geo.to_csv(index=False),
-                    "geographic_data.csv",
-                    "text/csv",
-                    help="Download the filtered geographic data as CSV"
-                )
-            else:
-                st.warning("⚠️ No geographic data available for the selected filters.")
-        else:
-            if not filtered_behavior.empty:
-                st.dataframe(filtered_behavior.head(max_rows), use_container_width=True)
-                st.download_button(
-                    "📥 Download Behavior Data",
-                    filtered_behavior.to_csv(index=False),
-                    "behavior_data.csv",
-                    "text/csv",
-                    help="Download the filtered behavior data as CSV"
-                )
-            else:
-                st.warning("⚠️ No behavior data available for the selected filters.")
+        render_data_export(filtered_segments, filtered_geo, filtered_behavior)
 
 if __name__ == "__main__":
     main()
@@ -61,8 +61,8 @@ def test_review_analytics():
         SELECT 
             COUNT(*) as total_reviews,
             ROUND(AVG(review_score), 2) as avg_rating,
-            COUNT(CASE WHEN review_score >= 4 THEN 1 END) as positive_reviews,
-            COUNT(CASE WHEN review_score <= 2 THEN 1 END) as negative_reviews
+            COUNTIF(review_score >= 4) as positive_reviews,
+            COUNTIF(review_score <= 2) as negative_reviews
         FROM `project-olist-470307.dbt_olist_analytics.revenue_analytics_obt`
         WHERE review_score IS NOT NULL
         """
@@ -6,6 +6,12 @@ Common utilities for database operations, visualizations, and data processing
 from .database import (
     load_config,
     get_bigquery_client, 
+    get_bigquery_storage_client,
+    build_job_config,
+    arrow_to_polars,
+    query_to_polars,
+    queries_to_polars,
+    cached_query_to_polars,
     execute_query,
     load_table_data,
     normalize_datetime_columns,
@@ -22,6 +28,11 @@ from .visualizations import (
     display_chart,
     display_dataframe,
     create_summary_stats,
+    build_bar_chart,
+    build_pie_chart,
+    build_scatter_chart,
+    hash_polars_frame,
+    POLARS_HASH_FUNCS,
     COLORS
 )
 
@@ -40,12 +51,16 @@ from .data_processing import (
 __version__ = "1.0.0"
 __all__ = [
     # Database utilities
-    'load_config', 'get_bigquery_client', 'execute_query', 'load_table_data',
+    'load_config', 'get_bigquery_client', 'get_bigquery_storage_client', 'arrow_to_polars',
+    'query_to_polars', 'queries_to_polars', 'cached_query_to_polars', 'build_job_config',
+    'execute_query', 'load_table_data',
     'normalize_datetime_columns', 'get_available_tables', 'validate_dataframe',
     
     # Visualization utilities  
     'create_metric_cards', 'create_bar_chart', 'create_pie_chart', 'create_line_chart',
-    'create_map_chart', 'display_chart', 'display_dataframe', 'create_summary_stats', 'COLORS',
+    'create_map_chart', 'display_chart', 'display_dataframe', 'create_summary_stats',
+    'build_bar_chart', 'build_pie_chart', 'build_scatter_chart', 'hash_polars_frame',
+    'POLARS_HASH_FUNCS', 'COLORS',
     
     # Data processing utilities
     'get_customer_segments', 'get_order_performance', 'get_review_insights', 
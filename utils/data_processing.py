@@ -30,6 +30,33 @@ def safe_aggregate(df: pl.DataFrame, expr: pl.Expr, default_value: Any = 0) -> A
     except Exception:
         return default_value
 
+def safe_aggregates(df: pl.DataFrame, exprs: Dict[str, pl.Expr], default_value: Any = 0) -> Dict[str, Any]:
+    """Safely execute several aggregations in a single pass and extract each result"""
+    defaults = {name: default_value for name in exprs}
+    try:
+        if df.is_empty():
+            return defaults
+        row = df.select([expr.alias(name) for name, expr in exprs.items()]).row(0, named=True)
+        return {name: default_value if value is None else value for name, value in row.items()}
+    except Exception:
+        return defaults
+
+def split_result_sets(df: pl.DataFrame, key: str = "result_type") -> Dict[str, pl.DataFrame]:
+    """Split a UNION ALL query result into one dataframe per result set label"""
+    if df.is_empty() or key not in df.columns:
+        return {}
+    return {
+        frame.get_column(key)[0]: frame.drop(key)
+        for frame in df.partition_by(key, maintain_order=True)
+    }
+
+def select_result_set(result_sets: Dict[str, pl.DataFrame], name: str, columns: List[pl.Expr]) -> pl.DataFrame:
+    """Select and rename the columns of one result set, empty if the set is missing"""
+    frame = result_sets.get(name)
+    if frame is None:
+        return pl.DataFrame()
+    return frame.select(columns)
+
 @st.cache_data(ttl=1800)  # Cache for 30 minutes
 def get_customer_segments():
     """Get customer segmentation analysis"""
@@ -116,49 +143,54 @@ def get_order_performance():
         return pl.DataFrame()
     
     query = f"""
-    WITH order_metrics AS (
+    WITH orders AS (
+        -- Empty-string delivery dates are normalized to NULL once, here
+        SELECT 
+            order_sk,
+            order_id,
+            order_status,
+            order_purchase_timestamp,
+            order_estimated_delivery_date,
+            CAST(NULLIF(order_delivered_customer_date, '') AS TIMESTAMP) as delivered_ts
+        FROM `{config['project_id']}.{config['dataset_id']}.dim_orders`
+        WHERE order_status IN ('delivered', 'shipped', 'processing')
+    ),
+    item_rollup AS (
+        -- Items are rolled up on the single order key before order attributes are joined
+        SELECT 
+            order_sk,
+            SUM(price) as order_value,
+            COUNT(product_sk) as items_count,
+            AVG(review_score) as order_review_score
+        FROM `{config['project_id']}.{config['dataset_id']}.fact_order_items`
+        GROUP BY order_sk
+    ),
+    order_metrics AS (
         SELECT 
             o.order_id,
             o.order_status,
             o.order_purchase_timestamp,
-            o.order_delivered_customer_date,
-            o.order_estimated_delivery_date,
-            CASE 
-                WHEN o.order_delivered_customer_date IS NOT NULL 
-                AND o.order_delivered_customer_date != ''
-                AND o.order_purchase_timestamp IS NOT NULL
-                THEN DATE_DIFF(
-                    DATE(CAST(o.order_delivered_customer_date AS TIMESTAMP)), 
-                    DATE(o.order_purchase_timestamp), 
-                    DAY
-                )
-                ELSE NULL
-            END as actual_delivery_days,
-            CASE 
-                WHEN o.order_estimated_delivery_date IS NOT NULL
-                AND o.order_purchase_timestamp IS NOT NULL
-                THEN DATE_DIFF(
-                    DATE(o.order_estimated_delivery_date), 
-                    DATE(o.order_purchase_timestamp), 
-                    DAY
-                )
-                ELSE NULL
-            END as estimated_delivery_days,
-            SUM(oi.price) as order_value,
-            COUNT(oi.product_sk) as items_count,
-            AVG(oi.review_score) as order_review_score
-        FROM `{config['project_id']}.{config['dataset_id']}.dim_orders` o
-        JOIN `{config['project_id']}.{config['dataset_id']}.fact_order_items` oi 
-            ON o.order_sk = oi.order_sk
-        WHERE o.order_status IN ('delivered', 'shipped', 'processing')
-        GROUP BY 1, 2, 3, 4, 5
+            -- DATE_DIFF propagates NULL inputs, so no CASE guard is needed
+            DATE_DIFF(DATE(o.delivered_ts), DATE(o.order_purchase_timestamp), DAY) as actual_delivery_days,
+            DATE_DIFF(DATE(o.order_estimated_delivery_date), DATE(o.order_purchase_timestamp), DAY) as estimated_delivery_days,
+            ir.order_value,
+            ir.items_count,
+            ir.order_review_score
+        FROM orders o
+        JOIN item_rollup ir 
+            ON o.order_sk = ir.order_sk
     )
-    SELECT *,
-        CASE 
-            WHEN actual_delivery_days IS NOT NULL AND estimated_delivery_days IS NOT NULL
-            THEN (actual_delivery_days - estimated_delivery_days)
-            ELSE NULL
-        END as delivery_difference
+    -- Raw delivery date strings are only needed for the day differences above
+    SELECT 
+        order_id,
+        order_status,
+        order_purchase_timestamp,
+        actual_delivery_days,
+        estimated_delivery_days,
+        order_value,
+        items_count,
+        order_review_score,
+        (actual_delivery_days - estimated_delivery_days) as delivery_difference
     FROM order_metrics
     WHERE order_purchase_timestamp IS NOT NULL
     ORDER BY order_purchase_timestamp DESC
@@ -184,17 +216,11 @@ def get_review_insights():
             c.customer_state,
             p.product_category_name,
             oi.price,
-            CASE 
-                WHEN r.review_creation_date IS NOT NULL 
-                AND o.order_delivered_customer_date IS NOT NULL
-                AND o.order_delivered_customer_date != ''
-                THEN DATE_DIFF(
-                    DATE(r.review_creation_date), 
-                    DATE(CAST(o.order_delivered_customer_date AS TIMESTAMP)), 
-                    DAY
-                )
-                ELSE NULL
-            END as days_to_review
+            DATE_DIFF(
+                DATE(r.review_creation_date), 
+                DATE(CAST(NULLIF(o.order_delivered_customer_date, '') AS TIMESTAMP)), 
+                DAY
+            ) as days_to_review
         FROM `{config['project_id']}.{config['dataset_id']}.dim_order_reviews` r
         JOIN `{config['project_id']}.{config['dataset_id']}.fact_order_items` oi 
             ON r.review_sk = oi.review_sk
@@ -278,30 +304,29 @@ def filter_data_by_date(df: pl.DataFrame, date_column: str,
     if df.is_empty() or date_column not in df.columns:
         return df
     
-    filtered_df = df.clone()
+    # Parse and filter in one lazy plan so Polars fuses them into a single pass
+    filtered_lf = df.lazy()
     
-    # Ensure datetime column - now with safer checking
-    try:
-        if not filtered_df.is_empty():
-            dtype_check = filtered_df.select(pl.col(date_column).dtype)
-            if not dtype_check.is_empty() and safe_item(dtype_check) != pl.Datetime:
-                filtered_df = filtered_df.with_columns(
-                    pl.col(date_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S", strict=False)
-                )
-    except Exception:
-        # If dtype checking fails, assume it's already datetime or skip conversion
-        pass
+    # Parse string dates once; datetime columns are used as-is
+    if df.schema[date_column] == pl.Utf8:
+        filtered_lf = filtered_lf.with_columns(
+            pl.col(date_column).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S", strict=False)
+        )
     
-    # Apply filters
+    # Combine both bounds into a single predicate
+    predicates = []
     if start_date:
         start_dt = pl.lit(start_date).str.strptime(pl.Datetime, "%Y-%m-%d")
-        filtered_df = filtered_df.filter(pl.col(date_column) >= start_dt)
+        predicates.append(pl.col(date_column) >= start_dt)
     
     if end_date:
         end_dt = pl.lit(end_date).str.strptime(pl.Datetime, "%Y-%m-%d")
-        filtered_df = filtered_df.filter(pl.col(date_column) <= end_dt)
+        predicates.append(pl.col(date_column) <= end_dt)
+    
+    if predicates:
+        filtered_lf = filtered_lf.filter(pl.all_horizontal(predicates))
     
-    return filtered_df
+    return filtered_lf.collect()
 
 def get_top_n_analysis(df: pl.DataFrame, group_by: str, value_col: str,
                       n: int = 10, agg_func: str = 'sum') -> pl.DataFrame:
@@ -320,9 +345,10 @@ def get_top_n_analysis(df: pl.DataFrame, group_by: str, value_col: str,
     if agg_func not in agg_funcs:
         agg_func = 'sum'
     
-    result = df.group_by(group_by).agg(
+    # top_k selects the n largest groups without sorting them all; only those n are ordered
+    result = df.lazy().group_by(group_by).agg(
         agg_funcs[agg_func].alias(value_col)
-    ).sort(value_col, descending=True).limit(n)
+    ).top_k(n, by=value_col).sort(value_col, descending=True).collect()
     
     return result
 
@@ -6,16 +6,32 @@ Centralized database connection and query functions
 import streamlit as st
 import polars as pl
 from google.cloud import bigquery
+from google.cloud import bigquery_storage
 from google.auth import default
 import json
 import os
-from typing import Optional, Dict, Any
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Query parameters as hashable (name, BigQuery type, value) tuples so they can be
+# passed through st.cache_data functions, e.g. (("start_date", "DATE", date(2018, 1, 1)),)
+QueryParams = Tuple[Tuple[str, str, Any], ...]
+
+# On-disk Parquet results survive Streamlit restarts, which drop the in-process caches.
+# Defaults to ~/.cache rather than the temp directory, which is often wiped on restart;
+# set DASHBOARD_CACHE_DIR to point it at a mounted volume
+PARQUET_CACHE_DIR = os.environ.get(
+    'DASHBOARD_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'marketing_dashboard')
+)
+
 @st.cache_data
 def load_config() -> Dict[str, Any]:
     """Load BigQuery configuration with error handling"""
@@ -42,6 +58,17 @@ def load_config() -> Dict[str, Any]:
         return {}
 
 @st.cache_resource
+def _create_bigquery_client(project_id: str) -> bigquery.Client:
+    """Create and test the shared BigQuery client; failures raise and are not cached"""
+    credentials, _ = default()
+    client = bigquery.Client(credentials=credentials, project=project_id)
+    
+    # Test connection
+    client.query("SELECT 1 as test").result()
+    logger.info(f"✅ Connected to BigQuery project: {project_id}")
+    
+    return client
+
 def get_bigquery_client() -> Optional[bigquery.Client]:
     """Initialize BigQuery client with caching and error handling"""
     try:
@@ -49,37 +76,121 @@ def get_bigquery_client() -> Optional[bigquery.Client]:
         if not config:
             return None
         
-        credentials, _ = default()
-        client = bigquery.Client(credentials=credentials, project=config['project_id'])
-        
-        # Test connection
-        client.query("SELECT 1 as test").result()
-        logger.info(f"✅ Connected to BigQuery project: {config['project_id']}")
-        
-        return client
+        return _create_bigquery_client(config['project_id'])
     except Exception as e:
         st.error(f"❌ Failed to connect to BigQuery: {str(e)}")
         logger.error(f"BigQuery connection failed: {str(e)}")
         return None
 
-@st.cache_data(ttl=3600)
-def execute_query(query: str, query_name: str = "Unknown") -> pl.DataFrame:
+@st.cache_resource
+def get_bigquery_storage_client() -> Optional[bigquery_storage.BigQueryReadClient]:
+    """Initialize BigQuery Storage read client for parallel Arrow downloads"""
+    try:
+        credentials, _ = default()
+        return bigquery_storage.BigQueryReadClient(credentials=credentials)
+    except Exception as e:
+        # Results still download over the REST API without the Storage client
+        logger.warning(f"BigQuery Storage client unavailable, using REST download: {str(e)}")
+        return None
+
+def build_job_config(params: Optional[QueryParams] = None) -> bigquery.QueryJobConfig:
+    """Build a job config binding named @parameters in the SQL"""
+    # Filters are bound as parameters rather than formatted into the SQL, so the
+    # query text stays fixed and BigQuery's results cache is reused per filter value
+    return bigquery.QueryJobConfig(
+        use_query_cache=True,
+        query_parameters=[
+            bigquery.ScalarQueryParameter(name, param_type, value) for name, param_type, value in (params or ())
+        ]
+    )
+
+def arrow_to_polars(table) -> pl.DataFrame:
+    """Load an Arrow result table into Polars without going through pandas"""
+    df = pl.from_arrow(table)
+    # BigQuery NUMERIC/BIGNUMERIC arrive as Arrow decimals; Plotly and the formatters expect floats
+    decimal_columns = [name for name, dtype in df.schema.items() if dtype == pl.Decimal]
+    if decimal_columns:
+        df = df.with_columns([pl.col(name).cast(pl.Float64) for name in decimal_columns])
+    return df
+
+def query_to_polars(client: bigquery.Client, query: str, params: Optional[QueryParams] = None) -> pl.DataFrame:
+    """Run a query and load its result into Polars straight from Arrow"""
+    result = client.query(query, job_config=build_job_config(params)).result()
+    return arrow_to_polars(result.to_arrow(bqstorage_client=get_bigquery_storage_client()))
+
+def queries_to_polars(client: bigquery.Client, queries: Dict[str, str],
+                      params: Optional[QueryParams] = None) -> Dict[str, pl.DataFrame]:
+    """Run independent queries concurrently and load each result into Polars"""
+    if not queries:
+        return {}
+    
+    # Submitting every job before waiting lets BigQuery execute them in parallel
+    jobs = {name: client.query(query, job_config=build_job_config(params)) for name, query in queries.items()}
+    # Resolved on the script thread; Streamlit caches are not available in worker threads
+    bqstorage_client = get_bigquery_storage_client()
+    
+    def download(job: bigquery.QueryJob) -> pl.DataFrame:
+        return arrow_to_polars(job.result().to_arrow(bqstorage_client=bqstorage_client))
+    
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {name: executor.submit(download, job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def cached_query_to_polars(client: bigquery.Client, query: str, cache_name: str,
+                           params: Optional[QueryParams] = None, max_age_seconds: int = 3600) -> pl.DataFrame:
+    """Run a query through a Parquet file cache in PARQUET_CACHE_DIR, reused until the time bucket rolls over"""
+    digest = hashlib.sha1(f"{query}|{params!r}".encode()).hexdigest()[:12]
+    bucket = int(time.time() // max_age_seconds)
+    path = os.path.join(PARQUET_CACHE_DIR, f"{cache_name}_{digest}_{bucket}.parquet")
+    
+    if os.path.exists(path):
+        try:
+            return pl.read_parquet(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable cache file {path}: {str(e)}")
+    
+    df = query_to_polars(client, query, params)
+    try:
+        os.makedirs(PARQUET_CACHE_DIR, exist_ok=True)
+        # Write then rename so a concurrent session never reads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        df.write_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+        # Drop files from earlier buckets of the same query
+        prefix = f"{cache_name}_{digest}_"
+        for name in os.listdir(PARQUET_CACHE_DIR):
+            if name.startswith(prefix) and name.endswith('.parquet') and name != os.path.basename(path):
+                os.remove(os.path.join(PARQUET_CACHE_DIR, name))
+    except OSError as e:
+        logger.warning(f"Could not write cache file {path}: {str(e)}")
+    return df
+
+# cache_resource hands back the cached frame by reference instead of unpickling a copy on
+# every rerun; safe because Polars operations return new frames rather than mutating.
+# Bounded because parameterised queries (e.g. ad-hoc date ranges) each add an entry
+@st.cache_resource(ttl=3600, max_entries=32)
+def _run_cached_query(_client: bigquery.Client, query: str, query_name: str,
+                      params: Optional[QueryParams] = None) -> pl.DataFrame:
+    """Run a query for execute_query; failures raise so they are never cached"""
+    # The leading underscore keeps the client out of the cache key
+    logger.info(f"Executing query: {query_name}")
+    return query_to_polars(_client, query, params)
+
+def execute_query(query: str, query_name: str = "Unknown", params: Optional[QueryParams] = None) -> pl.DataFrame:
     """Execute BigQuery query with caching and error handling"""
     try:
         client = get_bigquery_client()
         if client is None:
             return pl.DataFrame()
         
-        logger.info(f"Executing query: {query_name}")
-        # Get pandas DataFrame from BigQuery and convert to Polars
-        pandas_df = client.query(query).to_dataframe()
+        df = _run_cached_query(client, query, query_name, params)
         
-        if pandas_df.empty:
+        if df.is_empty():
             st.warning(f"⚠️ Query '{query_name}' returned no data")
             return pl.DataFrame()
         else:
-            logger.info(f"✅ Query '{query_name}' returned {len(pandas_df)} rows")
-            return pl.from_pandas(pandas_df)
+            logger.info(f"✅ Query '{query_name}' returned {df.height} rows")
+            return df
     except Exception as e:
         st.error(f"❌ Error executing query '{query_name}': {str(e)}")
         logger.error(f"Query execution failed for '{query_name}': {str(e)}")
@@ -110,21 +221,22 @@ def normalize_datetime_columns(df: pl.DataFrame, columns: list = None) -> pl.Dat
     if columns is None:
         columns = [col for col in df.columns if 'date' in col.lower() or 'time' in col.lower()]
     
+    schema = df.schema
     expressions = []
     for col in columns:
-        if col in df.columns:
-            try:
-                # Convert to datetime if not already, then normalize timezone
-                expressions.append(
-                    pl.col(col)
-                    .str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S%.f%z", strict=False)
-                    .dt.convert_time_zone("UTC")
-                    .dt.replace_time_zone(None)
-                    .alias(col)
-                )
-            except Exception as e:
-                logger.warning(f"Failed to normalize datetime column {col}: {str(e)}")
-                expressions.append(pl.col(col))  # Keep original if conversion fails
+        dtype = schema.get(col)
+        if dtype == pl.Datetime:
+            # Arrow results arrive typed; only timezone-aware columns need normalizing
+            if dtype.time_zone is not None:
+                expressions.append(pl.col(col).dt.convert_time_zone("UTC").dt.replace_time_zone(None))
+        elif dtype == pl.Utf8:
+            # Parse string timestamps, then normalize timezone
+            expressions.append(
+                pl.col(col)
+                .str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S%.f%z", strict=False)
+                .dt.convert_time_zone("UTC")
+                .dt.replace_time_zone(None)
+            )
     
     if expressions:
         return df.with_columns(expressions)
@@ -106,48 +106,54 @@ def enable_debug_mode():
     if st.session_state.show_performance:
         perf_tracker.display_performance_dashboard()
 
-def optimize_dataframe_memory(df: pl.DataFrame) -> pl.DataFrame:
-    """Optimize dataframe memory usage"""
+# Smallest signed integer types first, so each column lands in the narrowest that fits
+_INT_DOWNCAST_LADDER = [
+    (pl.Int8, -2**7, 2**7 - 1),
+    (pl.Int16, -2**15, 2**15 - 1),
+    (pl.Int32, -2**31, 2**31 - 1),
+]
+
+def optimize_dataframe_memory(df: pl.DataFrame, float32_columns: list = None) -> pl.DataFrame:
+    """Optimize dataframe memory usage by downcasting numeric columns
+    
+    Integer columns are narrowed losslessly to the smallest type that holds their
+    observed range. Float columns are only cast to Float32 when listed in
+    float32_columns, since precision loss is acceptable for plotting but not for totals.
+    """
     if df.is_empty():
         return df
     
-    # For Polars, memory optimization is handled automatically
-    # We can still provide some basic optimizations
-    
     try:
-        # Convert string columns to categorical if they have low cardinality
-        optimized_expressions = []
+        int_columns = [col for col, dtype in df.schema.items() if dtype in (pl.Int64, pl.Int32)]
         
-        for col in df.columns:
-            try:
-                col_dtype_result = df.select(pl.col(col).dtype)
-                if col_dtype_result.is_empty():
-                    optimized_expressions.append(pl.col(col))
-                    continue
-                    
-                col_dtype = col_dtype_result.item()
-                
-                # For string columns with low cardinality, keep as string (Polars handles this efficiently)
-                if col_dtype == pl.Utf8:
-                    unique_count = df.select(pl.col(col).n_unique()).item()
-                    total_count = df.select(pl.col(col).count()).item()
-                    unique_ratio = unique_count / total_count if total_count > 0 else 0
-                    if unique_ratio < 0.5:  # Less than 50% unique values
-                        # Polars strings are already memory efficient
-                        optimized_expressions.append(pl.col(col))
-                    else:
-                        optimized_expressions.append(pl.col(col))
-                else:
-                    optimized_expressions.append(pl.col(col))
-            except Exception:
-                # If any error occurs with a column, just keep it as is
-                optimized_expressions.append(pl.col(col))
+        # Single pass for the min/max of every integer column
+        bounds = {}
+        if int_columns:
+            bounds_row = df.select(
+                [pl.col(col).min().alias(f"{col}__min") for col in int_columns] +
+                [pl.col(col).max().alias(f"{col}__max") for col in int_columns]
+            ).row(0, named=True)
+            bounds = {col: (bounds_row[f"{col}__min"], bounds_row[f"{col}__max"]) for col in int_columns}
+        
+        expressions = []
+        for col, (col_min, col_max) in bounds.items():
+            if col_min is None or col_max is None:
+                continue
+            for dtype, low, high in _INT_DOWNCAST_LADDER:
+                if low <= col_min and col_max <= high:
+                    if dtype != df.schema[col]:
+                        expressions.append(pl.col(col).cast(dtype))
+                    break
+        
+        for col in float32_columns or []:
+            if col in df.columns and df.schema[col] == pl.Float64:
+                expressions.append(pl.col(col).cast(pl.Float32))
         
-        if optimized_expressions:
-            return df.with_columns(optimized_expressions)
+        if expressions:
+            return df.with_columns(expressions)
             
-    except Exception:
+    except Exception as e:
         # If any error occurs in optimization, return original dataframe
-        pass
+        logger.warning(f"Failed to optimize dataframe memory: {str(e)}")
     
     return df
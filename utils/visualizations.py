@@ -5,6 +5,8 @@ Reusable plotting functions with optimized styling
 
 import streamlit as st
 import polars as pl
+import polars.selectors as cs
+import hashlib
 import plotly.express as px
 import plotly.graph_objects as go
 from typing import Optional, Dict, Any
@@ -19,6 +21,17 @@ COLORS = {
     'palette': ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
 }
 
+def hash_polars_frame(df: pl.DataFrame) -> tuple:
+    """Cheap content hash for a Polars DataFrame, used as a Streamlit cache key"""
+    if df.is_empty():
+        return (tuple(df.columns), 0, "")
+    # Row hashes are computed natively; digesting them keeps row order significant
+    row_digest = hashlib.md5(df.hash_rows().to_numpy().tobytes()).hexdigest()
+    return (tuple(df.columns), df.height, row_digest)
+
+# Pass to @st.cache_resource / @st.cache_data so figure builders are keyed on data content
+POLARS_HASH_FUNCS = {pl.DataFrame: hash_polars_frame}
+
 def create_metric_cards(metrics, columns: int = 4):
     """Create metric cards in columns - supports both dict and list formats"""
     cols = st.columns(columns)
@@ -55,11 +68,10 @@ def create_bar_chart(data: pl.DataFrame, x: str, y: str, title: str,
         # If somehow pandas is passed, convert it to Polars first
         data = pl.from_pandas(data)
     
-    # Convert to pandas only for Plotly rendering
-    pandas_data = data.to_pandas()
+    # Plotly 6 reads Polars frames natively, so no pandas copy is made
     
     fig = px.bar(
-        pandas_data, 
+        data, 
         x=x, 
         y=y, 
         title=title,
@@ -82,11 +94,10 @@ def create_pie_chart(data: pl.DataFrame, values: str, names: str, title: str) ->
         # If somehow pandas is passed, convert it to Polars first
         data = pl.from_pandas(data)
     
-    # Convert to pandas only for Plotly rendering
-    pandas_data = data.to_pandas()
+    # Plotly 6 reads Polars frames natively, so no pandas copy is made
     
     fig = px.pie(
-        pandas_data,
+        data,
         values=values,
         names=names,
         title=title,
@@ -108,11 +119,10 @@ def create_line_chart(data: pl.DataFrame, x: str, y: str, title: str,
         # If somehow pandas is passed, convert it to Polars first
         data = pl.from_pandas(data)
     
-    # Convert to pandas only for Plotly rendering
-    pandas_data = data.to_pandas()
+    # Plotly 6 reads Polars frames natively, so no pandas copy is made
     
     fig = px.line(
-        pandas_data,
+        data,
         x=x,
         y=y,
         title=title,
@@ -136,11 +146,10 @@ def create_map_chart(data: pl.DataFrame, lat: str, lon: str,
         # If somehow pandas is passed, convert it to Polars first
         data = pl.from_pandas(data)
     
-    # Convert to pandas only for Plotly rendering
-    pandas_data = data.to_pandas()
+    # Plotly 6 reads Polars frames natively, so no pandas copy is made
     
     fig = px.scatter_map(
-        pandas_data,
+        data,
         lat=lat,
         lon=lon,
         size=size,
@@ -156,6 +165,55 @@ def create_map_chart(data: pl.DataFrame, lat: str, lon: str,
     
     return fig
 
+# Cached builders for the analytics pages; bounded because their keys change with every
+# data refresh and filter. cache_resource hands back the figure without re-pickling it
+@st.cache_resource(ttl=1800, max_entries=32, hash_funcs=POLARS_HASH_FUNCS)
+def build_bar_chart(data: pl.DataFrame, x: str, y: str, title: str, color_scale: str,
+                    orientation: str = 'v', height: int = 400, hover_data: tuple = ()) -> go.Figure:
+    """Bar chart coloured by its value axis, cached on data content"""
+    value = x if orientation == 'h' else y
+    fig = px.bar(
+        data,
+        x=x,
+        y=y,
+        orientation=orientation,
+        title=title,
+        color=value,
+        color_continuous_scale=color_scale,
+        hover_data=list(hover_data) or None
+    )
+    fig.update_layout(height=height)
+    return fig
+
+@st.cache_resource(ttl=1800, max_entries=16, hash_funcs=POLARS_HASH_FUNCS)
+def build_pie_chart(data: pl.DataFrame, values: str, names: str, title: str, palette: list) -> go.Figure:
+    """Pie chart, cached on data content"""
+    fig = go.Figure(go.Pie(
+        values=data[values].to_numpy(),
+        labels=data[names].to_list(),
+        marker=dict(colors=palette)
+    ))
+    fig.update_layout(title=title, height=400)
+    return fig
+
+@st.cache_resource(ttl=1800, max_entries=8, hash_funcs=POLARS_HASH_FUNCS)
+def build_scatter_chart(data: pl.DataFrame, x: str, y: str, title: str, size: Optional[str] = None,
+                        color: Optional[str] = None, hover_data: tuple = (),
+                        labels: Optional[Dict[str, str]] = None, height: int = 400) -> go.Figure:
+    """Scatter chart, cached on data content"""
+    fig = px.scatter(
+        data,
+        x=x,
+        y=y,
+        size=size,
+        color=color,
+        hover_data=list(hover_data) or None,
+        title=title,
+        labels=labels or {}
+    )
+    fig.update_layout(height=height)
+    return fig
+
 def display_chart(fig: go.Figure, key: Optional[str] = None):
     """Display chart with consistent styling"""
     st.plotly_chart(fig, width="stretch", key=key)
@@ -168,30 +226,25 @@ def display_dataframe(df: pl.DataFrame, title: str, max_rows: int = 100):
         st.warning("No data available")
         return
     
-    # Always work with Polars, convert only for display
+    # Always work with Polars
     if not isinstance(df, pl.DataFrame):
         # If somehow pandas is passed, convert it to Polars first
         df = pl.from_pandas(df)
     
-    # Convert to pandas only for Streamlit display
-    pandas_df = df.to_pandas()
-    
     # Show data info
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Rows", f"{len(pandas_df):,}")
+        st.metric("Total Rows", f"{df.height:,}")
     with col2:
-        st.metric("Columns", len(pandas_df.columns))
+        st.metric("Columns", df.width)
     with col3:
-        memory_usage = pandas_df.memory_usage(deep=True).sum() / 1024 / 1024
-        st.metric("Memory Usage", f"{memory_usage:.1f} MB")
+        st.metric("Memory Usage", f"{df.estimated_size('mb'):.1f} MB")
     
-    # Display data with pure Polars approach
-    display_df = pandas_df[:max_rows] if len(pandas_df) > max_rows else pandas_df
-    st.dataframe(display_df, width="stretch")
+    # Only the displayed rows are handed to Streamlit
+    st.dataframe(df.head(max_rows), width="stretch")
     
-    if len(pandas_df) > max_rows:
-        st.info(f"Showing first {max_rows} rows of {len(pandas_df):,} total rows")
+    if df.height > max_rows:
+        st.info(f"Showing first {max_rows} rows of {df.height:,} total rows")
 
 def create_summary_stats(df: pl.DataFrame, numeric_only: bool = True) -> pl.DataFrame:
     """Create summary statistics for dataframe"""
@@ -199,43 +252,26 @@ def create_summary_stats(df: pl.DataFrame, numeric_only: bool = True) -> pl.Data
         return pl.DataFrame()
     
     if numeric_only:
-        # Get numeric columns
-        numeric_cols = []
-        try:
-            for col in df.columns:
-                try:
-                    dtype_result = df.select(pl.col(col).dtype)
-                    if not dtype_result.is_empty():
-                        col_dtype = dtype_result.item()
-                        if col_dtype in [pl.Float64, pl.Int64, pl.Float32, pl.Int32]:
-                            numeric_cols.append(col)
-                except Exception:
-                    continue
-            
-            if numeric_cols:
-                # Calculate summary statistics for numeric columns
-                stats_data = {}
-                for col in numeric_cols:
-                    try:
-                        col_stats = df.select([
-                            pl.col(col).count().alias(f"{col}_count"),
-                            pl.col(col).mean().alias(f"{col}_mean"),
-                            pl.col(col).std().alias(f"{col}_std"),
-                            pl.col(col).min().alias(f"{col}_min"),
-                            pl.col(col).max().alias(f"{col}_max")
-                        ])
-                        for stat_col in col_stats.columns:
-                            try:
-                                stats_data[stat_col] = [col_stats.select(pl.col(stat_col)).item()] if not col_stats.is_empty() else [0]
-                            except Exception:
-                                stats_data[stat_col] = [0]
-                    except Exception:
-                        continue
-                
-                return pl.DataFrame(stats_data)
-        except Exception:
-            # If any error occurs, fall through to basic info
-            pass
+        # Every numeric width, including the Int8/Int16 columns optimize_dataframe_memory produces
+        numeric_cols = df.select(cs.numeric()).columns
+        
+        if numeric_cols:
+            try:
+                # Every statistic for every numeric column in a single select
+                return df.select([
+                    stat
+                    for col in numeric_cols
+                    for stat in (
+                        pl.col(col).count().alias(f"{col}_count"),
+                        pl.col(col).mean().alias(f"{col}_mean"),
+                        pl.col(col).std().alias(f"{col}_std"),
+                        pl.col(col).min().alias(f"{col}_min"),
+                        pl.col(col).max().alias(f"{col}_max")
+                    )
+                ])
+            except Exception:
+                # If any error occurs, fall through to basic info
+                pass
     
     # For non-numeric or all columns, return basic info
     return pl.DataFrame({